@@ -12,10 +12,16 @@ Features:
 
 import tkinter as tk
 from tkinter import ttk, messagebox
-import requests
 import json
 import os
+import sys
+import queue
+import argparse
+import threading
 from datetime import datetime, timedelta
+from currency_core import CrossRateMatrix, RateCache, convert_csv
+from rate_history import RateHistory, NUMPY_AVAILABLE
+from rate_providers import ProviderPool, cross_validate
 
 class CurrencyConverter:
     def __init__(self, root):
@@ -25,12 +31,16 @@ class CurrencyConverter:
         self.root.resizable(False, False)
         self.root.configure(bg='#2C3E50')
         
-        # API endpoint (free tier - no API key needed)
-        self.api_url = "https://api.exchangerate-api.com/v4/latest/"
+        # Rate APIs (free tiers - no API key needed), tried in order on one pooled session
+        self.providers = ProviderPool.default()
         
         # Cache settings
         self.cache_file = "exchange_rates_cache.json"
         self.cache_duration = timedelta(hours=6)  # Cache for 6 hours
+        self.rate_cache = RateCache(self.cache_file, self.providers, max_age=self.cache_duration)
+        
+        # Every fetched snapshot is kept for historical lookups (needs NumPy)
+        self.rate_history = RateHistory() if NUMPY_AVAILABLE else None
         
         # History file
         self.history_file = "conversion_history.json"
@@ -40,13 +50,17 @@ class CurrencyConverter:
             'USD', 'EUR', 'GBP', 'JPY', 'AUD', 'CAD', 'CHF', 'CNY', 'INR', 'MXN'
         ]
         
-        # Load data
+        # Rates fetched by the background worker, handed to the Tk thread through this queue
+        self.fetch_results = queue.Queue()
+        self.fetching = False
+        self.refresh_job = None
+        
+        # Create UI first so it can paint before any network request finishes
         self.exchange_rates = {}
         self.currencies = []
-        self.load_exchange_rates()
-        
-        # Create UI
+        self.cross_rates = CrossRateMatrix({})
         self.create_widgets()
+        self.load_exchange_rates()
     
     def create_widgets(self):
         """Create all UI widgets"""
@@ -185,7 +199,7 @@ class CurrencyConverter:
         button_frame.pack(pady=10)
         
         # Refresh rates button
-        refresh_button = tk.Button(
+        self.refresh_button = tk.Button(
             button_frame,
             text="🔃 Refresh Rates",
             command=self.refresh_rates,
@@ -197,7 +211,7 @@ class CurrencyConverter:
             bd=2,
             cursor='hand2'
         )
-        refresh_button.grid(row=0, column=0, padx=5)
+        self.refresh_button.grid(row=0, column=0, padx=5)
         
         # History button
         history_button = tk.Button(
@@ -251,58 +265,114 @@ class CurrencyConverter:
         self.update_popular_rates()
     
     def load_exchange_rates(self):
-        """Load exchange rates from cache or API"""
-        # Try loading from cache first
-        if os.path.exists(self.cache_file):
-            try:
-                with open(self.cache_file, 'r') as f:
-                    cache_data = json.load(f)
-                
-                # Check if cache is still valid
-                cache_time = datetime.fromisoformat(cache_data['timestamp'])
-                if datetime.now() - cache_time < self.cache_duration:
-                    self.exchange_rates = cache_data['rates']
-                    self.currencies = sorted(self.exchange_rates.keys())
-                    self.update_status(f"Using cached rates (updated: {cache_time.strftime('%Y-%m-%d %H:%M')})")
-                    return
-            except:
-                pass
-        
-        # Fetch from API
-        self.refresh_rates()
+        """Show cached rates right away (memory or disk), then revalidate in the background if stale"""
+        rates, updated = self.rate_cache.get()
+        if rates is not None:
+            self.set_rates(rates)
+            self.show_rates()
+            self.record_history(rates, updated)
+            self.update_status(f"Using cached rates (updated: {updated.strftime('%Y-%m-%d %H:%M')})")
+        elif self.rate_cache.load_error:
+            self.update_status(f"✗ {self.rate_cache.load_error}")
+        
+        # Stale or missing cache: fetch quietly, the cached rates stay usable meanwhile
+        if self.rate_cache.is_stale():
+            self.refresh_rates(notify=False)
+        else:
+            self.schedule_refresh()
+    
+    def set_rates(self, rates):
+        """Install new USD-based rates and rebuild the cross-rate matrix"""
+        self.exchange_rates = rates
+        self.currencies = sorted(rates.keys())
+        self.cross_rates = CrossRateMatrix(rates)
+    
+    def show_rates(self):
+        """Update the widgets that display the current rates"""
+        self.from_currency['values'] = self.currencies
+        self.to_currency['values'] = self.currencies
+        self.update_popular_rates()
     
-    def refresh_rates(self):
-        """Fetch latest exchange rates from API"""
+    def refresh_rates(self, notify=True):
+        """Start fetching the latest exchange rates on a background thread"""
+        if self.fetching:
+            return
+        if self.refresh_job is not None:
+            self.root.after_cancel(self.refresh_job)
+            self.refresh_job = None
+        self.fetching = True
+        self.refresh_button.config(state='disabled')
+        self.update_status("Fetching latest rates...")
+        
+        worker = threading.Thread(target=self.fetch_worker, args=(notify,), daemon=True)
+        worker.start()
+        self.root.after(100, self.poll_fetch)
+    
+    def record_history(self, rates, timestamp=None):
+        """Append a rate snapshot to the history store (a failure here never blocks conversions)"""
+        if self.rate_history is None:
+            return
         try:
-            self.update_status("Fetching latest rates...")
-            response = requests.get(f"{self.api_url}USD", timeout=10)
-            
-            if response.status_code == 200:
-                data = response.json()
-                self.exchange_rates = data['rates']
-                self.currencies = sorted(self.exchange_rates.keys())
-                
-                # Update comboboxes
-                self.from_currency['values'] = self.currencies
-                self.to_currency['values'] = self.currencies
-                
-                # Save to cache
-                cache_data = {
-                    'timestamp': datetime.now().isoformat(),
-                    'rates': self.exchange_rates
-                }
-                with open(self.cache_file, 'w') as f:
-                    json.dump(cache_data, f, indent=4)
-                
-                self.update_status("✓ Rates updated successfully!")
-                self.update_popular_rates()
-                messagebox.showinfo("Success", "Exchange rates updated successfully!")
-            else:
-                raise Exception("Failed to fetch rates")
-        
+            self.rate_history.append(rates, timestamp)
+        except (OSError, ValueError) as e:
+            print(f"Could not record rate history: {e}")
+    
+    def provider_summary(self):
+        """Which provider answered the last refresh, and how fast"""
+        name = self.rate_cache.entry['provider']
+        for stats in self.providers.metrics():
+            if stats['provider'] == name and stats['last_latency_ms'] is not None:
+                return f"{name}, {stats['last_latency_ms']:.0f} ms"
+        return name
+    
+    def schedule_refresh(self):
+        """Revalidate again when the rates go stale, or when the backoff after a failure ends"""
+        if self.refresh_job is not None:
+            self.root.after_cancel(self.refresh_job)
+        delay_ms = max(1000, int(self.rate_cache.refresh_in() * 1000))
+        self.refresh_job = self.root.after(delay_ms, self.auto_refresh)
+    
+    def auto_refresh(self):
+        """Scheduled background refresh"""
+        self.refresh_job = None
+        self.refresh_rates(notify=False)
+    
+    def fetch_worker(self, notify):
+        """Background thread: revalidate the rate cache (never touches Tk widgets)"""
+        try:
+            rates, changed = self.rate_cache.revalidate()
+            if changed:
+                self.record_history(rates)
+            self.fetch_results.put((rates, changed, None, notify))
         except Exception as e:
-            self.update_status(f"✗ Error: {str(e)}")
-            messagebox.showerror("Error", "Failed to fetch exchange rates.\nUsing cached rates if available.")
+            self.fetch_results.put((None, False, e, notify))
+    
+    def poll_fetch(self):
+        """Tk thread: apply the worker's result once it arrives"""
+        try:
+            rates, changed, error, notify = self.fetch_results.get_nowait()
+        except queue.Empty:
+            self.root.after(100, self.poll_fetch)
+            return
+        
+        self.fetching = False
+        self.refresh_button.config(state='normal')
+        self.schedule_refresh()
+        if error is None:
+            source = self.provider_summary()
+            if changed:
+                self.set_rates(rates)
+                self.show_rates()
+                self.update_status(f"✓ Rates updated successfully! ({source})")
+            else:
+                self.update_status(f"✓ Rates are up to date ({source})")
+            if notify:
+                messagebox.showinfo("Success", "Exchange rates updated successfully!")
+        else:
+            retry = self.rate_cache.refresh_in()
+            self.update_status(f"✗ Error: {str(error)} (retrying in {retry:.0f}s)")
+            if notify or not self.exchange_rates:
+                messagebox.showerror("Error", "Failed to fetch exchange rates.\nUsing cached rates if available.")
     
     def convert_currency(self):
         """Perform currency conversion"""
@@ -316,23 +386,9 @@ class CurrencyConverter:
                 messagebox.showwarning("Warning", "Please select both currencies")
                 return
             
-            # Convert to USD first, then to target currency
-            if from_curr != 'USD':
-                amount_in_usd = amount / self.exchange_rates[from_curr]
-            else:
-                amount_in_usd = amount
-            
-            # Convert to target currency
-            if to_curr != 'USD':
-                result = amount_in_usd * self.exchange_rates[to_curr]
-            else:
-                result = amount_in_usd
-            
-            # Calculate exchange rate
-            if from_curr != 'USD':
-                rate = self.exchange_rates[to_curr] / self.exchange_rates[from_curr]
-            else:
-                rate = self.exchange_rates[to_curr]
+            # Direct lookup in the precomputed cross-rate matrix
+            rate = self.cross_rates.rate(from_curr, to_curr)
+            result = amount * rate
             
             # Display result
             self.result_label.config(
@@ -346,7 +402,7 @@ class CurrencyConverter:
             
             # Save to history
             self.save_to_history(amount, from_curr, result, to_curr, rate)
-            
+        
         except ValueError:
             messagebox.showerror("Error", "Please enter a valid number")
         except KeyError:
@@ -457,16 +513,131 @@ class CurrencyConverter:
                 text_widget.insert('end', "-"*60 + "\n\n")
             
             text_widget.config(state='disabled')
-            
+        
         except Exception as e:
             messagebox.showerror("Error", f"Failed to load history: {str(e)}")
     
     def update_status(self, message):
         """Update status label"""
         self.status_label.config(text=message)
-        self.root.update()
+
+def convert_csv_file(args):
+    """Headless CSV conversion using cached rates (fetched once if there is no cache)"""
+    rate_cache = RateCache("exchange_rates_cache.json", ProviderPool.default())
+    rates, updated = rate_cache.get()
+    if rates is None:
+        if rate_cache.load_error:
+            print(f"✗ {rate_cache.load_error}")
+        print("No cached rates, fetching latest rates...")
+        try:
+            rates, changed = rate_cache.revalidate()
+        except Exception as e:
+            print(f"✗ Failed to fetch exchange rates: {e}")
+            return 1
+        if NUMPY_AVAILABLE:
+            RateHistory().append(rates)
+    
+    cross_rates = CrossRateMatrix(rates)
+    source = f"the '{args.from_column}' column" if args.from_column else args.from_code.upper()
+    try:
+        rows, seconds = convert_csv(cross_rates, args.input, args.output, args.amount_column,
+                                    args.to.upper(), from_code=args.from_code and args.from_code.upper(),
+                                    from_column=args.from_column, output_column=args.output_column)
+    except KeyError as e:
+        print(f"✗ Unknown currency: {e}")
+        return 1
+    except (OSError, ValueError) as e:
+        print(f"✗ Conversion failed: {e}")
+        return 1
+    
+    rate = f"{rows / seconds:,.0f} rows/sec" if seconds > 0 else "n/a"
+    print(f"✓ Converted {rows} rows from {source} to {args.to.upper()} → {args.output} ({rate})")
+    return 0
+
+def show_rate_on(args):
+    """Headless historical lookup: convert at the rate recorded on a given date"""
+    if not NUMPY_AVAILABLE:
+        print("✗ Rate history needs NumPy (pip install numpy)")
+        return 1
+    try:
+        when = datetime.fromisoformat(args.rate_on)
+        from_code, to_code = args.from_code.upper(), args.to.upper()
+        history = RateHistory()
+        rate = history.rate_on(when, from_code, to_code)
+    except KeyError as e:
+        print(f"✗ Unknown currency: {e}")
+        return 1
+    except ValueError as e:
+        print(f"✗ {e}")
+        return 1
+    
+    recorded = history.dates()[history.row_on(when)].astype(datetime)
+    print(f"{args.amount:,.2f} {from_code} = {args.amount * rate:,.2f} {to_code} on {args.rate_on}")
+    print(f"Exchange Rate: 1 {from_code} = {rate:.6f} {to_code} (recorded {recorded:%Y-%m-%d %H:%M})")
+    return 0
+
+def prefetch_bases(args):
+    """Fetch several base currencies concurrently, cross-check them, and report provider metrics"""
+    bases = [base.strip().upper() for base in args.prefetch.split(',') if base.strip()]
+    if 'USD' not in bases:
+        bases.insert(0, 'USD')
+    
+    providers = ProviderPool.default()
+    results = providers.prefetch(bases)
+    tables = {}
+    for base, result in results.items():
+        if isinstance(result, Exception):
+            print(f"✗ {base}: {result}")
+        else:
+            rates, provider = result
+            tables[base] = rates
+            print(f"✓ {base}: {len(rates)} rates from {provider}")
+    
+    if 'USD' in tables and len(tables) > 1:
+        print("\nCross-check against USD:")
+        for base, (deviation, code) in cross_validate(tables).items():
+            flag = "✓" if deviation <= args.tolerance else "✗"
+            worst = f" (worst: {code})" if code else ""
+            print(f"  {flag} {base}: max deviation {deviation:.4%}{worst}")
+    
+    print("\nProvider metrics:")
+    for stats in providers.metrics():
+        latency = f"{stats['avg_latency_ms']:.0f} ms avg" if stats['avg_latency_ms'] is not None else "unused"
+        print(f"  {stats['provider']}: {stats['requests']} requests, {stats['errors']} errors, {latency}")
+        if stats['last_error']:
+            print(f"    last error: {stats['last_error']}")
+    return 0 if len(tables) == len(bases) else 1
 
 def main():
+    parser = argparse.ArgumentParser(description="Currency Converter (starts the GUI when run without arguments)")
+    parser.add_argument('--convert-csv', nargs=2, metavar=('INPUT', 'OUTPUT'),
+                        help="add a converted amount column to every row of a CSV file")
+    parser.add_argument('--amount-column', default='amount', help="column holding the amounts (default: amount)")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--from', dest='from_code', help="source currency for every row")
+    source.add_argument('--from-column', help="column holding each row's source currency")
+    parser.add_argument('--to', help="target currency")
+    parser.add_argument('--output-column', help="name of the added column (default: <amount column>_<TO>)")
+    parser.add_argument('--rate-on', metavar='DATE', help="convert at the historical rate on DATE (YYYY-MM-DD[THH:MM])")
+    parser.add_argument('--amount', type=float, default=1.0, help="amount for --rate-on (default: 1)")
+    parser.add_argument('--prefetch', metavar='BASES', help="fetch several bases at once and cross-check them (e.g. EUR,GBP,JPY)")
+    parser.add_argument('--tolerance', type=float, default=0.01, help="largest accepted deviation for --prefetch (default: 0.01 = 1%%)")
+    args = parser.parse_args()
+    
+    if args.prefetch:
+        sys.exit(prefetch_bases(args))
+    
+    if args.rate_on:
+        if not args.to or not args.from_code:
+            parser.error("--rate-on needs --from and --to")
+        sys.exit(show_rate_on(args))
+    
+    if args.convert_csv:
+        if not args.to or not (args.from_code or args.from_column):
+            parser.error("--convert-csv needs --to and either --from or --from-column")
+        args.input, args.output = args.convert_csv
+        sys.exit(convert_csv_file(args))
+    
     root = tk.Tk()
     app = CurrencyConverter(root)
     root.mainloop()
@@ -0,0 +1,248 @@
+"""
+Currency Core - GUI-independent conversion engine
+Features:
+- Dense cross-rate matrix built once per rate refresh (rate[i][j] = 1 unit of i in j)
+- Scalar convert() and vectorized convert_many() for millions of amounts
+- Streaming CSV converter that appends a converted column to every row
+- Tiered rate cache (memory, then disk, then network) with conditional requests
+- Works without NumPy (pure Python fallback), just slower
+"""
+
+import csv
+import json
+import os
+import time
+import threading
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+class CrossRateMatrix:
+    """All pairwise exchange rates, precomputed from 'units per base currency' rates"""
+    
+    def __init__(self, rates, base='USD'):
+        self.base = base
+        self.codes = sorted(set(rates) | {base})
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        per_base = [1.0 if code == base and code not in rates else float(rates[code]) for code in self.codes]
+        
+        if NUMPY_AVAILABLE:
+            # matrix[i, j] = per_base[j] / per_base[i]
+            vector = np.array(per_base, dtype=np.float64)
+            self.matrix = vector[np.newaxis, :] / vector[:, np.newaxis]
+        else:
+            self.matrix = [[to_rate / from_rate for to_rate in per_base] for from_rate in per_base]
+    
+    def __contains__(self, code):
+        return code in self.index
+    
+    def rate(self, from_code, to_code):
+        """Units of to_code for one unit of from_code (KeyError for unknown codes)"""
+        return float(self.matrix[self.index[from_code]][self.index[to_code]])
+    
+    def convert(self, amount, from_code, to_code):
+        """Convert one amount"""
+        return amount * self.rate(from_code, to_code)
+    
+    def indices(self, codes):
+        """Matrix row/column numbers for a sequence of currency codes"""
+        if isinstance(codes, str):
+            return self.index[codes]
+        if not NUMPY_AVAILABLE:
+            return [self.index[code] for code in codes]
+        if not isinstance(codes, np.ndarray):
+            return np.fromiter(map(self.index.__getitem__, codes), dtype=np.intp, count=len(codes))
+        
+        # Arrays of codes: look up each distinct code once, then expand back to the full length
+        unique, inverse = np.unique(codes, return_inverse=True)
+        lookup = np.array([self.index[str(code)] for code in unique], dtype=np.intp)
+        return lookup[inverse.reshape(-1)]
+    
+    def convert_many(self, amounts, from_codes, to_codes):
+        """Convert many amounts at once; codes may be single strings or one per amount"""
+        from_index = self.indices(from_codes)
+        to_index = self.indices(to_codes)
+        
+        if NUMPY_AVAILABLE:
+            return np.asarray(amounts, dtype=np.float64) * self.matrix[from_index, to_index]
+        
+        count = len(amounts)
+        from_index = [from_index] * count if isinstance(from_index, int) else from_index
+        to_index = [to_index] * count if isinstance(to_index, int) else to_index
+        return [amount * self.matrix[f][t] for amount, f, t in zip(amounts, from_index, to_index)]
+
+class RateCache:
+    """Rates for one base currency: memory first, then the cache file, then the providers
+    
+    Stale rates are still served; revalidate() refreshes them with a
+    conditional request (If-None-Match / If-Modified-Since), so an unchanged
+    rate table costs a 304 instead of a full download. Failed refreshes back
+    off exponentially. revalidate() blocks, so callers run it off the UI thread.
+    """
+    
+    def __init__(self, cache_file, providers, base='USD', max_age=timedelta(hours=6),
+                 min_backoff=30, max_backoff=3600):
+        self.cache_file = cache_file
+        self.providers = providers
+        self.base = base
+        self.max_age = max_age
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        
+        self.entry = None
+        self.disk_checked = False
+        self.load_error = None
+        self.failures = 0
+        self.retry_at = None
+        self.lock = threading.Lock()
+    
+    def get(self):
+        """Cached rates of any age as (rates, timestamp), or (None, None); never touches the network"""
+        with self.lock:
+            if self.entry is None and not self.disk_checked:
+                self.disk_checked = True
+                self.entry = self.read_disk()
+            if self.entry is None:
+                return None, None
+            return self.entry['rates'], self.entry['timestamp']
+    
+    def read_disk(self):
+        """The cache file's entry, or None (a damaged file is reported through load_error)"""
+        if not os.path.exists(self.cache_file):
+            return None
+        try:
+            with open(self.cache_file, 'r') as f:
+                data = json.load(f)
+            return {
+                'rates': dict(data['rates']),
+                'timestamp': datetime.fromisoformat(data['timestamp']),
+                'etag': data.get('etag'),
+                'last_modified': data.get('last_modified'),
+                'provider': data.get('provider')
+            }
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.load_error = f"{self.cache_file} is unreadable ({e})"
+            return None
+    
+    def write_disk(self, entry):
+        """Write the cache file atomically so a crash never leaves half a file"""
+        data = {
+            'timestamp': entry['timestamp'].isoformat(),
+            'base': self.base,
+            'etag': entry['etag'],
+            'last_modified': entry['last_modified'],
+            'provider': entry['provider'],
+            'rates': entry['rates']
+        }
+        temp_path = self.cache_file + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(data, f, indent=4)
+        os.replace(temp_path, self.cache_file)
+    
+    def is_stale(self):
+        """Whether the cached rates are missing or older than max_age"""
+        rates, timestamp = self.get()
+        return rates is None or datetime.now() - timestamp >= self.max_age
+    
+    def refresh_in(self):
+        """Seconds until the next background refresh is due (backoff after failures)"""
+        if self.retry_at is not None:
+            return max(0.0, (self.retry_at - datetime.now()).total_seconds())
+        rates, timestamp = self.get()
+        if rates is None:
+            return 0.0
+        return max(0.0, (timestamp + self.max_age - datetime.now()).total_seconds())
+    
+    def conditional_headers(self, provider):
+        """If-None-Match / If-Modified-Since for a provider, but only the one that issued the validators"""
+        headers = {}
+        entry = self.entry
+        if entry is not None and entry['provider'] == provider.name:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+    
+    def revalidate(self):
+        """Refresh from the providers; returns (rates, changed). Raises on failure after scheduling a retry"""
+        self.get()
+        try:
+            rates, response, provider = self.providers.fetch(self.base, self.conditional_headers)
+            if rates is None:
+                if self.entry is None:
+                    raise ValueError(f"{provider.name} answered 304 Not Modified without a cached copy")
+                entry = dict(self.entry, timestamp=datetime.now())
+                changed = False
+            else:
+                entry = {
+                    'rates': rates,
+                    'timestamp': datetime.now(),
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'provider': provider.name
+                }
+                changed = True
+            self.write_disk(entry)
+        except Exception:
+            # Back off 30s, 60s, 120s, ... up to max_backoff between failed attempts
+            self.failures += 1
+            delay = min(self.max_backoff, self.min_backoff * 2 ** (self.failures - 1))
+            self.retry_at = datetime.now() + timedelta(seconds=delay)
+            raise
+        
+        with self.lock:
+            self.entry = entry
+            self.load_error = None
+        self.failures = 0
+        self.retry_at = None
+        return entry['rates'], changed
+
+def convert_csv(matrix, input_path, output_path, amount_column, to_code, from_code=None,
+                from_column=None, output_column=None, chunk_size=100000):
+    """Stream a CSV through the converter, adding a column with the converted amount
+    
+    The source currency is either one code for the whole file (from_code) or a
+    column holding a code per row (from_column). Rows are converted chunk by
+    chunk with convert_many, so memory use does not grow with the file size.
+    Returns (rows, seconds).
+    """
+    start = time.perf_counter()
+    output_column = output_column or f"{amount_column}_{to_code}"
+    rows = 0
+    
+    with open(input_path, 'r', newline='', encoding='utf-8-sig') as infile, \
+         open(output_path, 'w', newline='', encoding='utf-8') as outfile:
+        reader = csv.reader(infile)
+        writer = csv.writer(outfile)
+        
+        header = next(reader)
+        try:
+            amount_at = header.index(amount_column)
+            from_at = header.index(from_column) if from_column else None
+        except ValueError as e:
+            raise ValueError(f"Column not found in {input_path}: {e}")
+        writer.writerow(header + [output_column])
+        
+        chunk = []
+        for row in reader:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                rows += write_converted(matrix, writer, chunk, amount_at, from_at, from_code, to_code)
+                chunk = []
+        if chunk:
+            rows += write_converted(matrix, writer, chunk, amount_at, from_at, from_code, to_code)
+    
+    return rows, time.perf_counter() - start
+
+def write_converted(matrix, writer, chunk, amount_at, from_at, from_code, to_code):
+    """Convert and write one chunk of CSV rows"""
+    amounts = [float(row[amount_at].replace(',', '') or 0) for row in chunk]
+    from_codes = [row[from_at].strip().upper() for row in chunk] if from_at is not None else from_code
+    converted = matrix.convert_many(amounts, from_codes, to_code)
+    writer.writerows(row + [f"{value:.2f}"] for row, value in zip(chunk, converted))
+    return len(chunk)
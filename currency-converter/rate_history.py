@@ -0,0 +1,195 @@
+"""
+Rate History - Append-only time series of exchange-rate snapshots
+Features:
+- One float64 column per currency, one row per fetched snapshot (USD based)
+- Separate sorted date index, so "rate on date X" is a binary search
+- Range queries return zero-copy NumPy views over a memory-mapped file
+- A torn final row after a crash is trimmed on open
+- Widening the table for new currencies switches files atomically through columns.json
+- Requires NumPy; the converter simply skips recording without it
+"""
+
+import os
+import json
+import threading
+from datetime import datetime
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+class RateHistory:
+    """Snapshots stored as raw arrays: dates.i64 (seconds) and rates.f64 (rows x currencies)
+    
+    columns.json names the currencies and the rates file that holds them, so
+    the table width and its data always change together.
+    """
+    
+    def __init__(self, history_dir="rate_history"):
+        self.history_dir = history_dir
+        self.dates_file = os.path.join(history_dir, "dates.i64")
+        self.rates_file = os.path.join(history_dir, "rates.f64")
+        self.columns_file = os.path.join(history_dir, "columns.json")
+        self.lock = threading.Lock()
+        
+        os.makedirs(history_dir, exist_ok=True)
+        self.currencies = []
+        if os.path.exists(self.columns_file):
+            with open(self.columns_file, 'r') as f:
+                columns = json.load(f)
+            self.currencies = columns['currencies']
+            self.rates_file = os.path.join(history_dir, columns.get('rates_file', "rates.f64"))
+        self.column = {code: i for i, code in enumerate(self.currencies)}
+        self.remove_stale_tables()
+        self.rows = self.trim_torn_rows()
+        self.dates_map = self.rates_map = None
+    
+    def __len__(self):
+        return self.rows
+    
+    def remove_stale_tables(self):
+        """Delete rates files left behind by an interrupted or finished add_columns"""
+        current = os.path.basename(self.rates_file)
+        for name in os.listdir(self.history_dir):
+            if name.startswith("rates.") and name.endswith(".f64") and name != current:
+                os.remove(os.path.join(self.history_dir, name))
+    
+    def trim_torn_rows(self):
+        """Cut both files back to the last complete snapshot; returns the row count
+        
+        Rates are written before dates, so only the rates file can be ahead.
+        If it holds fewer rows than the date file, the two do not belong
+        together and nothing is truncated (ValueError).
+        """
+        width = len(self.currencies)
+        date_rows = os.path.getsize(self.dates_file) // 8 if os.path.exists(self.dates_file) else 0
+        rate_rows = os.path.getsize(self.rates_file) // (8 * width) if width and os.path.exists(self.rates_file) else 0
+        if width and rate_rows < date_rows:
+            raise ValueError(f"{self.rates_file} has {rate_rows} rows of {width} currencies but "
+                             f"{self.dates_file} has {date_rows} dates; refusing to truncate")
+        rows = date_rows
+        for path, size in ((self.dates_file, rows * 8), (self.rates_file, rows * 8 * width)):
+            if os.path.exists(path) and os.path.getsize(path) != size:
+                os.truncate(path, size)
+        return rows
+    
+    def dates(self):
+        """Snapshot times as a memory-mapped datetime64[s] array (sorted)"""
+        with self.lock:
+            if self.dates_map is None and self.rows:
+                self.dates_map = np.memmap(self.dates_file, dtype=np.int64, mode='r',
+                                           shape=(self.rows,)).view('datetime64[s]')
+            return self.dates_map if self.rows else np.empty(0, dtype='datetime64[s]')
+    
+    def rates(self):
+        """All snapshots as a memory-mapped (rows x currencies) float64 array"""
+        with self.lock:
+            if self.rates_map is None and self.rows:
+                self.rates_map = np.memmap(self.rates_file, dtype=np.float64, mode='r',
+                                           shape=(self.rows, len(self.currencies)))
+            return self.rates_map if self.rows else np.empty((0, len(self.currencies)))
+    
+    def append(self, rates, timestamp=None):
+        """Record one snapshot; returns False if it is not newer than the last one or unchanged"""
+        stamp = np.datetime64(timestamp or datetime.now(), 's').astype(np.int64)
+        with self.lock:
+            if self.rows:
+                last_date = np.fromfile(self.dates_file, dtype=np.int64, count=1, offset=(self.rows - 1) * 8)[0]
+                if stamp <= last_date:
+                    return False
+            
+            new_codes = sorted(set(rates) - set(self.column))
+            if new_codes:
+                self.add_columns(new_codes)
+            row = np.full(len(self.currencies), np.nan)
+            for code, value in rates.items():
+                row[self.column[code]] = value
+            
+            if self.rows:
+                last_row = np.fromfile(self.rates_file, dtype=np.float64, count=len(self.currencies),
+                                       offset=(self.rows - 1) * 8 * len(self.currencies))
+                if np.array_equal(last_row, row, equal_nan=True):
+                    return False
+            
+            # Rates first, then the date: the date file decides how many rows are complete
+            with open(self.rates_file, 'ab') as f:
+                f.write(row.tobytes())
+            with open(self.dates_file, 'ab') as f:
+                f.write(np.int64(stamp).tobytes())
+            self.rows += 1
+            self.dates_map = self.rates_map = None
+        return True
+    
+    def add_columns(self, codes):
+        """Widen the table for newly seen currencies (older rows get NaN); rare, so a full rewrite
+        
+        The widened table goes to a new file named after its width, and
+        replacing columns.json is the commit point: a crash before it leaves
+        the old columns and the old file, a crash after it the new ones.
+        """
+        old_width = len(self.currencies)
+        table = np.fromfile(self.rates_file, dtype=np.float64, count=self.rows * old_width) if self.rows else np.empty(0)
+        currencies = self.currencies + codes
+        
+        widened = np.full((self.rows, len(currencies)), np.nan)
+        widened[:, :old_width] = table.reshape(self.rows, old_width)
+        rates_name = f"rates.{len(currencies)}.f64"
+        rates_file = os.path.join(self.history_dir, rates_name)
+        with open(rates_file, 'wb') as f:
+            widened.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        
+        temp_path = self.columns_file + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'currencies': currencies, 'rates_file': rates_name}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.columns_file)
+        
+        old_file, self.rates_file = self.rates_file, rates_file
+        self.currencies = currencies
+        self.column = {code: i for i, code in enumerate(self.currencies)}
+        self.rates_map = None
+        try:
+            os.remove(old_file)
+        except OSError:
+            pass  # Still mapped somewhere (Windows) or never created; removed on the next open
+    
+    def row_on(self, when):
+        """Index of the latest snapshot at or before 'when' (ValueError if there is none)"""
+        position = np.searchsorted(self.dates(), np.datetime64(when, 's'), side='right') - 1
+        if position < 0:
+            raise ValueError(f"No exchange rates recorded on or before {when}")
+        return int(position)
+    
+    def rate_on(self, when, from_code, to_code):
+        """Rate (units of to_code per from_code) in effect at 'when' (KeyError for unknown codes)"""
+        row = self.rates()[self.row_on(when)]
+        rate = row[self.column[to_code]] / row[self.column[from_code]]
+        if np.isnan(rate):
+            raise ValueError(f"No {from_code}/{to_code} rate recorded on or before {when}")
+        return float(rate)
+    
+    def convert_on(self, when, amount, from_code, to_code):
+        """Convert at the rate in effect at 'when'"""
+        return amount * self.rate_on(when, from_code, to_code)
+    
+    def range_slice(self, start=None, end=None):
+        """Row range [lo, hi) of snapshots with start <= date <= end"""
+        dates = self.dates()
+        lo = np.searchsorted(dates, np.datetime64(start, 's'), 'left') if start is not None else 0
+        hi = np.searchsorted(dates, np.datetime64(end, 's'), 'right') if end is not None else len(dates)
+        return int(lo), int(hi)
+    
+    def series(self, code, start=None, end=None):
+        """(dates, USD rates) for one currency as zero-copy views of the memory-mapped files"""
+        lo, hi = self.range_slice(start, end)
+        return self.dates()[lo:hi], self.rates()[lo:hi, self.column[code]]
+    
+    def cross_series(self, from_code, to_code, start=None, end=None):
+        """(dates, rates) for any currency pair; the rates are computed, so they are a new array"""
+        dates, to_rates = self.series(to_code, start, end)
+        return dates, to_rates / self.series(from_code, start, end)[1]
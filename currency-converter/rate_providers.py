@@ -0,0 +1,220 @@
+"""
+Rate Providers - Exchange-rate APIs behind one interface
+Features:
+- Every provider shares one keep-alive requests.Session (a pooled connection per host)
+- Failover: providers are tried in order; one that just failed is tried last for a cool-down period
+- Concurrent prefetch of several base currencies (asyncio + worker threads)
+- Cross-validation of the prefetched tables against each other
+- Per-provider latency and error metrics
+"""
+
+import time
+import asyncio
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+def make_session(pool_size=8):
+    """Shared HTTP session; connections are kept alive and reused between refreshes"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept'] = 'application/json'
+    return session
+
+class RateProvider:
+    """One exchange-rate API; subclasses describe its URL and payload"""
+    
+    name = "provider"
+    
+    def __init__(self, session, timeout=10):
+        self.session = session
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+        self.total_latency = 0.0
+        self.last_latency = None
+        self.last_error = None
+        self.failed_at = None
+    
+    def url(self, base):
+        raise NotImplementedError
+    
+    def parse(self, response):
+        """Rates (units per one base currency) from a successful response"""
+        return response.json()['rates']
+    
+    def fetch(self, base, headers=None):
+        """GET the rates for one base; returns the response (200 or 304) and records metrics"""
+        start = time.perf_counter()
+        try:
+            response = self.session.get(self.url(base), headers=headers or {}, timeout=self.timeout)
+            if response.status_code != 304:
+                response.raise_for_status()
+        except Exception as e:
+            self.record(time.perf_counter() - start, e)
+            raise
+        self.record(time.perf_counter() - start, None)
+        return response
+    
+    def read(self, response):
+        """parse() that counts a malformed payload as an error"""
+        try:
+            return self.parse(response)
+        except Exception as e:
+            with self.lock:
+                self.errors += 1
+                self.consecutive_errors += 1
+                self.last_error = f"bad response: {e}"
+                self.failed_at = time.monotonic()
+            raise
+    
+    def record(self, latency, error):
+        """Count one request in the metrics"""
+        with self.lock:
+            self.requests += 1
+            self.total_latency += latency
+            self.last_latency = latency
+            if error is None:
+                self.consecutive_errors = 0
+            else:
+                self.errors += 1
+                self.consecutive_errors += 1
+                self.last_error = str(error)
+                self.failed_at = time.monotonic()
+    
+    def metrics(self):
+        """Request count, error rate and latency (ms) so far"""
+        with self.lock:
+            return {
+                'provider': self.name,
+                'requests': self.requests,
+                'errors': self.errors,
+                'error_rate': self.errors / self.requests if self.requests else 0.0,
+                'avg_latency_ms': 1000 * self.total_latency / self.requests if self.requests else None,
+                'last_latency_ms': 1000 * self.last_latency if self.last_latency is not None else None,
+                'last_error': self.last_error
+            }
+    
+    def cooling_down(self, cooldown):
+        """Whether the provider failed within the last 'cooldown' seconds"""
+        with self.lock:
+            return self.consecutive_errors > 0 and time.monotonic() - self.failed_at < cooldown
+
+class ExchangeRateAPI(RateProvider):
+    """exchangerate-api.com v4 (no key needed)"""
+    
+    name = "exchangerate-api.com"
+    
+    def url(self, base):
+        return f"https://api.exchangerate-api.com/v4/latest/{base}"
+
+class OpenExchangeRateAPI(RateProvider):
+    """open.er-api.com v6 (no key needed)"""
+    
+    name = "open.er-api.com"
+    
+    def url(self, base):
+        return f"https://open.er-api.com/v6/latest/{base}"
+    
+    def parse(self, response):
+        data = response.json()
+        if data.get('result') != 'success':
+            raise ValueError(f"{self.name}: {data.get('error-type', 'request failed')}")
+        return data['rates']
+
+class FrankfurterAPI(RateProvider):
+    """frankfurter.app (ECB reference rates, about 30 currencies)"""
+    
+    name = "frankfurter.app"
+    
+    def url(self, base):
+        return f"https://api.frankfurter.app/latest?from={base}"
+    
+    def parse(self, response):
+        # The base currency itself is left out of the table
+        data = response.json()
+        return dict(data['rates'], **{data['base']: 1.0})
+
+class ProviderPool:
+    """Providers tried in order with failover, all sharing one session
+    
+    A provider that fails is moved to the back for 'cooldown' seconds, then
+    gets its place back, so the primary is retried once it may have recovered.
+    """
+    
+    def __init__(self, providers, cooldown=300):
+        self.providers = providers
+        self.cooldown = cooldown
+    
+    @classmethod
+    def default(cls, timeout=10, cooldown=300):
+        """The built-in providers on a shared session"""
+        session = make_session()
+        return cls([ExchangeRateAPI(session, timeout), OpenExchangeRateAPI(session, timeout),
+                    FrankfurterAPI(session, timeout)], cooldown)
+    
+    def ordered(self):
+        """Providers outside their cool-down first (stable, so the configured order is kept otherwise)"""
+        return sorted(self.providers, key=lambda provider: provider.cooling_down(self.cooldown))
+    
+    def fetch(self, base, headers_for=None):
+        """First successful (rates, response, provider); rates is None for a 304 Not Modified
+        
+        headers_for(provider) gives the extra request headers for each provider
+        tried, since conditional-request validators only mean something to the
+        provider that issued them. Raises the last error if every provider fails.
+        """
+        error = None
+        for provider in self.ordered():
+            try:
+                response = provider.fetch(base, headers_for(provider) if headers_for else None)
+                rates = provider.read(response) if response.status_code != 304 else None
+                return rates, response, provider
+            except Exception as e:
+                error = e
+        raise error or RuntimeError("No rate providers configured")
+    
+    def fetch_rates(self, base):
+        """Parsed rates for one base, with failover; returns (rates, provider name)"""
+        rates, response, provider = self.fetch(base)
+        return rates, provider.name
+    
+    async def prefetch_async(self, bases):
+        """Fetch several bases concurrently; maps base -> (rates, provider) or the exception"""
+        results = await asyncio.gather(*(asyncio.to_thread(self.fetch_rates, base) for base in bases),
+                                       return_exceptions=True)
+        return dict(zip(bases, results))
+    
+    def prefetch(self, bases):
+        """Blocking wrapper around prefetch_async for callers without an event loop"""
+        return asyncio.run(self.prefetch_async(list(bases)))
+    
+    def metrics(self):
+        """Metrics for every provider"""
+        return [provider.metrics() for provider in self.providers]
+
+def cross_validate(tables, reference='USD'):
+    """Largest relative disagreement between each base's table and the reference table
+    
+    For every base, rate(base -> X) should equal rate(ref -> X) / rate(ref -> base).
+    Returns {base: (worst deviation, currency)} for the bases other than the reference.
+    """
+    ref = tables[reference]
+    report = {}
+    for base, rates in tables.items():
+        if base == reference or base not in ref:
+            continue
+        worst, worst_code = 0.0, None
+        for code, rate in rates.items():
+            if code in ref and rate:
+                expected = ref[code] / ref[base]
+                deviation = abs(rate - expected) / expected
+                if deviation > worst:
+                    worst, worst_code = deviation, code
+        report[base] = (worst, worst_code)
+    return report
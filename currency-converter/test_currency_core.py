@@ -0,0 +1,171 @@
+"""
+Tests for RateCache against a local HTTP stand-in for a rate API
+Run with: python -m pytest test_currency_core.py (or python -m unittest)
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+import http.server
+from datetime import datetime, timedelta
+from unittest import mock
+
+import currency_core
+from currency_core import RateCache
+from rate_providers import RateProvider, ProviderPool, make_session
+
+ETAG = '"rates-v1"'
+LAST_MODIFIED = 'Sat, 17 Oct 2026 00:00:00 GMT'
+RATES = {'USD': 1.0, 'EUR': 0.9, 'GBP': 0.8}
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    """Serves RATES with an ETag, answers 304 to a matching validator, or 503 when told to"""
+    
+    def log_message(self, format, *args):
+        pass
+    
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+        if server.status == 503:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.send_header('ETag', ETAG)
+            self.end_headers()
+            return
+        body = json.dumps({'rates': RATES}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', ETAG)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        self.end_headers()
+        self.wfile.write(body)
+
+class StandInProvider(RateProvider):
+    """RateProvider pointed at the local server"""
+    
+    name = "stand-in"
+    
+    def __init__(self, session, port):
+        super().__init__(session, timeout=5)
+        self.port = port
+    
+    def url(self, base):
+        return f"http://127.0.0.1:{self.port}/latest/{base}"
+
+class RateCacheTest(unittest.TestCase):
+    """Conditional requests, 304 handling, backoff and the atomic cache write"""
+    
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+    
+    def setUp(self):
+        self.server.status = 200
+        self.server.requests = []
+        self.directory = tempfile.mkdtemp()
+        self.cache_file = os.path.join(self.directory, "rates.json")
+        self.session = make_session()
+        self.providers = ProviderPool([StandInProvider(self.session, self.server.server_address[1])])
+        self.cache = RateCache(self.cache_file, self.providers)
+    
+    def tearDown(self):
+        self.session.close()
+        shutil.rmtree(self.directory)
+    
+    def test_first_fetch_is_unconditional(self):
+        rates, changed = self.cache.revalidate()
+        self.assertEqual(rates, RATES)
+        self.assertTrue(changed)
+        self.assertNotIn('If-None-Match', self.server.requests[0])
+        self.assertNotIn('If-Modified-Since', self.server.requests[0])
+    
+    def test_refresh_sends_validators(self):
+        self.cache.revalidate()
+        self.cache.revalidate()
+        headers = self.server.requests[1]
+        self.assertEqual(headers['If-None-Match'], ETAG)
+        self.assertEqual(headers['If-Modified-Since'], LAST_MODIFIED)
+    
+    def test_validators_survive_a_restart(self):
+        self.cache.revalidate()
+        reopened = RateCache(self.cache_file, self.providers)
+        rates, changed = reopened.revalidate()
+        self.assertEqual(self.server.requests[1]['If-None-Match'], ETAG)
+        self.assertEqual(rates, RATES)
+        self.assertFalse(changed)
+    
+    def test_not_modified_bumps_timestamp(self):
+        self.cache.revalidate()
+        old_stamp = datetime.now() - timedelta(hours=7)
+        self.cache.entry['timestamp'] = old_stamp
+        self.assertTrue(self.cache.is_stale())
+        
+        rates, changed = self.cache.revalidate()
+        self.assertFalse(changed)
+        self.assertEqual(rates, RATES)
+        self.assertGreater(self.cache.get()[1], old_stamp)
+        self.assertFalse(self.cache.is_stale())
+        with open(self.cache_file) as f:
+            on_disk = json.load(f)
+        self.assertGreater(datetime.fromisoformat(on_disk['timestamp']), old_stamp)
+        self.assertEqual(on_disk['etag'], ETAG)
+    
+    def test_backoff_doubles_and_is_capped(self):
+        self.cache.max_backoff = 100
+        self.server.status = 503
+        delays = []
+        for _ in range(4):
+            before = datetime.now()
+            with self.assertRaises(Exception):
+                self.cache.revalidate()
+            delays.append((self.cache.retry_at - before).total_seconds())
+        for delay, expected in zip(delays, [30, 60, 100, 100]):
+            self.assertAlmostEqual(delay, expected, delta=2)
+        self.assertAlmostEqual(self.cache.refresh_in(), 100, delta=2)
+    
+    def test_success_resets_backoff(self):
+        self.server.status = 503
+        with self.assertRaises(Exception):
+            self.cache.revalidate()
+        self.assertEqual(self.cache.failures, 1)
+        self.server.status = 200
+        self.cache.revalidate()
+        self.assertEqual(self.cache.failures, 0)
+        self.assertIsNone(self.cache.retry_at)
+    
+    def test_cache_write_is_atomic(self):
+        self.cache.revalidate()
+        self.assertFalse(os.path.exists(self.cache_file + ".tmp"))
+        with open(self.cache_file) as f:
+            original = f.read()
+        self.assertEqual(json.loads(original)['rates'], RATES)
+        
+        def torn_dump(data, f, **kwargs):
+            f.write('{"timestamp": ')
+            raise OSError("disk full")
+        
+        self.cache.entry['timestamp'] -= timedelta(hours=7)
+        with mock.patch.object(currency_core.json, 'dump', torn_dump):
+            with self.assertRaises(OSError):
+                self.cache.revalidate()
+        with open(self.cache_file) as f:
+            self.assertEqual(f.read(), original)
+
+if __name__ == "__main__":
+    unittest.main()
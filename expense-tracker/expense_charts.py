@@ -0,0 +1,164 @@
+"""
+Expense Charts - Pie, line and bar charts drawn from the expense rollups
+Features:
+- matplotlib is imported only when a chart is actually drawn
+- Headless mode (Agg backend) writes PNG or SVG files, no display needed
+- Saved charts are cached by a hash of their data; unchanged data reuses the file
+- Line charts with many days are downsampled (largest-triangle-three-buckets)
+"""
+
+import os
+import sys
+import glob
+import json
+import hashlib
+from datetime import datetime
+
+# Folder for saved charts, and the most points drawn on the line chart
+CHART_DIR = "charts"
+MAX_LINE_POINTS = 500
+
+# Bump when the drawing code changes so old cached images are not reused
+CHART_VERSION = 1
+
+CHART_KINDS = ['pie', 'line', 'bar']
+CHART_FORMATS = ['png', 'svg']
+
+def load_pyplot(headless=False):
+    """Import pyplot on first use (Agg backend when headless); None if matplotlib is missing"""
+    try:
+        import matplotlib
+        if headless:
+            matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return None
+    return plt
+
+def display_available():
+    """Whether an interactive chart window can be opened"""
+    if os.name == 'nt' or sys.platform == 'darwin':
+        return True
+    return bool(os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+
+def downsample(xs, ys, max_points):
+    """Largest-triangle-three-buckets: keep the points that best preserve the line's shape"""
+    count = len(xs)
+    if count <= max_points or max_points < 3:
+        return xs, ys
+    
+    # First and last points are always kept; the rest are split into equal buckets
+    bucket_size = (count - 2) / (max_points - 2)
+    keep = [0]
+    previous = 0
+    for bucket in range(max_points - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+        
+        # Average of the next bucket is the third corner of the triangle
+        next_start, next_end = end, min(int((bucket + 2) * bucket_size) + 1, count)
+        avg_x = (next_start + next_end - 1) / 2
+        avg_y = sum(ys[next_start:next_end]) / max(next_end - next_start, 1)
+        
+        best, best_area = start, -1.0
+        for index in range(start, end):
+            area = abs((previous - avg_x) * (ys[index] - ys[previous])
+                       - (previous - index) * (avg_y - ys[previous]))
+            if area > best_area:
+                best, best_area = index, area
+        keep.append(best)
+        previous = best
+    keep.append(count - 1)
+    
+    return [xs[i] for i in keep], [ys[i] for i in keep]
+
+def chart_data(kind, rollups):
+    """The series a chart is drawn from, taken from the rollups"""
+    if kind == 'pie':
+        totals = rollups.category_totals()
+        categories = sorted(totals)
+        return categories, [round(totals[c], 2) for c in categories]
+    if kind == 'line':
+        dates, amounts = rollups.date_totals()
+        return dates, [round(a, 2) for a in amounts]
+    if kind == 'bar':
+        months, amounts = rollups.month_totals()
+        return months, [round(a, 2) for a in amounts]
+    raise ValueError(f"Unknown chart type: {kind}")
+
+def chart_key(kind, data):
+    """Short hash identifying a chart's data and drawing code"""
+    payload = json.dumps([CHART_VERSION, kind, data], separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+def draw_pie(plt, labels, amounts):
+    """Create pie chart by category"""
+    plt.figure(figsize=(10, 8))
+    plt.pie(amounts, labels=labels, autopct='%1.1f%%', startangle=90)
+    plt.title('Expenses by Category', fontsize=16, fontweight='bold')
+    plt.axis('equal')
+    plt.tight_layout()
+
+def draw_line(plt, dates, amounts):
+    """Create line chart over time"""
+    title = 'Expenses Over Time'
+    if len(dates) > MAX_LINE_POINTS:
+        title += f' ({MAX_LINE_POINTS} of {len(dates)} days shown)'
+        dates, amounts = downsample(dates, amounts, MAX_LINE_POINTS)
+    days = [datetime.strptime(d, "%Y-%m-%d") for d in dates]
+    
+    plt.figure(figsize=(12, 6))
+    # Markers only help when the points are far enough apart to see them
+    plt.plot(days, amounts, marker='o' if len(days) <= 100 else None, linewidth=2, markersize=6)
+    plt.xlabel('Date', fontsize=12)
+    plt.ylabel('Amount ($)', fontsize=12)
+    plt.title(title, fontsize=16, fontweight='bold')
+    plt.xticks(rotation=45)
+    plt.grid(True, alpha=0.3)
+    plt.tight_layout()
+
+def draw_bar(plt, months, amounts):
+    """Create bar chart for monthly comparison"""
+    plt.figure(figsize=(12, 6))
+    plt.bar(months, amounts, color='skyblue', edgecolor='navy')
+    plt.xlabel('Month', fontsize=12)
+    plt.ylabel('Total Amount ($)', fontsize=12)
+    plt.title('Monthly Expenses Comparison', fontsize=16, fontweight='bold')
+    plt.xticks(rotation=45)
+    plt.grid(True, axis='y', alpha=0.3)
+    plt.tight_layout()
+
+DRAW = {'pie': draw_pie, 'line': draw_line, 'bar': draw_bar}
+
+def render_chart(kind, rollups, fmt=None, chart_dir=CHART_DIR):
+    """Draw a chart; saves it as fmt ('png'/'svg') or shows a window when fmt is None
+    
+    Returns (path, cached) for saved charts, (None, False) when shown.
+    Raises ImportError if matplotlib is not installed.
+    """
+    labels, amounts = chart_data(kind, rollups)
+    
+    path = None
+    if fmt is not None:
+        path = os.path.join(chart_dir, f"{kind}_{chart_key(kind, [labels, amounts])}.{fmt}")
+        if os.path.exists(path):
+            return path, True
+    
+    plt = load_pyplot(headless=fmt is not None)
+    if plt is None:
+        raise ImportError("matplotlib is not installed")
+    
+    DRAW[kind](plt, labels, amounts)
+    if fmt is None:
+        plt.show()
+        return None, False
+    
+    # Drop older renders of this chart, then write the new one atomically
+    os.makedirs(chart_dir, exist_ok=True)
+    for old in glob.glob(os.path.join(chart_dir, f"{kind}_*.{fmt}")):
+        os.remove(old)
+    temp_path = path + ".tmp"
+    plt.savefig(temp_path, format=fmt, dpi=100)
+    plt.close()
+    os.replace(temp_path, path)
+    return path, False
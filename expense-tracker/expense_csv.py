@@ -0,0 +1,97 @@
+"""
+Expense CSV - Streaming bulk import and export
+Features:
+- Import reads the CSV row by row and stores validated rows in chunks
+- Export streams from storage in date order, never holding every expense in memory
+- Transparent gzip for .gz files on both sides
+- Reports rows/sec for each transfer
+"""
+
+import csv
+import gzip
+import io
+import sys
+import time
+import contextlib
+from datetime import date
+
+# Columns written on export (and expected on import)
+CSV_FIELDS = ['date', 'description', 'category', 'amount']
+
+def open_csv(path, mode):
+    """Open a CSV file for text I/O, gzip-compressed when the name ends with .gz ('-' = stdin/stdout)"""
+    if path == '-':
+        return contextlib.nullcontext(sys.stdin if mode == 'r' else sys.stdout)
+    # utf-8-sig skips the byte order mark some spreadsheet exports start with
+    encoding = 'utf-8-sig' if mode == 'r' else 'utf-8'
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, mode + 'b'), encoding=encoding, newline='')
+    return open(path, mode, encoding=encoding, newline='')
+
+def parse_row(row, default_category="Other"):
+    """Validate one CSV (or JSON) row; returns an expense dict or None if the row is unusable"""
+    def field(name):
+        value = row.get(name)
+        return str(value).strip() if value is not None else ''
+    
+    try:
+        day = date.fromisoformat(field('date')).isoformat()
+        amount = float(field('amount').replace('$', '').replace(',', ''))
+    except ValueError:
+        return None
+    if not amount > 0:
+        return None
+    return {
+        'date': day,
+        'description': field('description'),
+        'category': field('category') or default_category,
+        'amount': amount
+    }
+
+def import_csv(storage, path, chunk_size=5000):
+    """Stream a CSV file into storage; returns (imported, skipped, seconds)"""
+    start = time.perf_counter()
+    imported = skipped = 0
+    chunk = []
+    
+    with open_csv(path, 'r') as f:
+        reader = csv.DictReader(f)
+        # Accept any capitalisation of the header (e.g. "Date,Description,Category,Amount")
+        reader.fieldnames = [name.strip().lower() for name in reader.fieldnames or []]
+        for row in reader:
+            expense = parse_row(row)
+            if expense is None:
+                skipped += 1
+                continue
+            chunk.append(expense)
+            if len(chunk) >= chunk_size:
+                imported += storage.add_many(chunk)
+                chunk = []
+        if chunk:
+            imported += storage.add_many(chunk)
+    
+    return imported, skipped, time.perf_counter() - start
+
+def export_csv(storage, path):
+    """Stream every expense to a CSV file in date order; returns (rows, seconds)"""
+    start = time.perf_counter()
+    rows = 0
+    
+    with open_csv(path, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_FIELDS)
+        batch = []
+        for expense in storage.iter_expenses():
+            batch.append((expense['date'], expense['description'], expense['category'], expense['amount']))
+            if len(batch) >= 5000:
+                writer.writerows(batch)
+                rows += len(batch)
+                batch = []
+        writer.writerows(batch)
+        rows += len(batch)
+    
+    return rows, time.perf_counter() - start
+
+def rate(rows, seconds):
+    """Rows per second, formatted for display"""
+    return f"{rows / seconds:,.0f} rows/sec" if seconds > 0 else "n/a"
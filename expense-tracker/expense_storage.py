@@ -0,0 +1,986 @@
+"""
+Expense Storage - Pluggable storage backends for the expense tracker
+Backends:
+- JSONStorage: the original expenses.json file (rewritten on every change)
+- SQLiteStorage: indexed SQLite database with O(1) appends and SQL-side filtering
+- LedgerStorage: append-only JSON-lines ledger with tombstones and background compaction
+Every backend also keeps rollups (totals by month and category, and by day) for reports.
+"""
+
+import bisect
+import contextlib
+import heapq
+import json
+import os
+import re
+import sqlite3
+import threading
+
+from expense_columns import build_columns
+
+# Fields every expense record has
+EXPENSE_FIELDS = ['id', 'date', 'description', 'category', 'amount']
+
+def filter_expenses(expenses, start_date=None, end_date=None, category=None, descending=False, limit=None):
+    """Filter and sort in-memory expenses the way the SQL backend does"""
+    expenses = [
+        e for e in expenses
+        if (start_date is None or e['date'] >= start_date)
+        and (end_date is None or e['date'] <= end_date)
+        and (category is None or e['category'] == category)
+    ]
+    expenses.sort(key=lambda x: x['date'], reverse=descending)
+    return expenses[:limit] if limit is not None else expenses
+
+def expense_matcher(min_amount=None, max_amount=None, text=None, regex=False):
+    """Predicate for the amount range and description filters (case-insensitive)"""
+    pattern = None
+    if text:
+        pattern = re.compile(text if regex else re.escape(text), re.IGNORECASE)
+    
+    def matches(expense):
+        if min_amount is not None and expense['amount'] < min_amount:
+            return False
+        if max_amount is not None and expense['amount'] > max_amount:
+            return False
+        return pattern is None or pattern.search(expense['description']) is not None
+    return matches
+
+class Rollups:
+    """Running totals by (month, category) and by day, updated one expense at a time"""
+    
+    def __init__(self, by_month_category=None, by_day=None):
+        # (month, category) -> [total, count] and day -> [total, count]
+        self.by_month_category = by_month_category if by_month_category is not None else {}
+        self.by_day = by_day if by_day is not None else {}
+    
+    @classmethod
+    def from_expenses(cls, expenses):
+        """Build rollups from raw expenses in one vectorized pass"""
+        return cls(*build_columns(expenses).rollup())
+    
+    def add(self, expense, sign=1):
+        """Count an expense in (or, with sign=-1, out of) both tables"""
+        keys = ((self.by_month_category, (expense['date'][:7], expense['category'])),
+                (self.by_day, expense['date']))
+        for table, key in keys:
+            entry = table.setdefault(key, [0.0, 0])
+            entry[0] += sign * expense['amount']
+            entry[1] += sign
+            if entry[1] <= 0:
+                del table[key]
+    
+    def remove(self, expense):
+        self.add(expense, sign=-1)
+    
+    def category_totals(self, month=None):
+        """Total per category, for one 'YYYY-MM' month or overall"""
+        totals = {}
+        for (entry_month, category), (total, count) in self.by_month_category.items():
+            if month is None or entry_month == month:
+                totals[category] = totals.get(category, 0) + total
+        return totals
+    
+    def date_totals(self):
+        """Total per day: (days, amounts) in date order"""
+        days = sorted(self.by_day)
+        return days, [self.by_day[day][0] for day in days]
+    
+    def month_totals(self):
+        """Total per month: (months, amounts) in date order"""
+        totals = {}
+        for (month, category), (total, count) in self.by_month_category.items():
+            totals[month] = totals.get(month, 0) + total
+        months = sorted(totals)
+        return months, [totals[month] for month in months]
+    
+    def differences(self, other, tolerance=1e-6):
+        """Keys whose total or count differ between two sets of rollups"""
+        mismatched = []
+        for mine, theirs in ((self.by_month_category, other.by_month_category), (self.by_day, other.by_day)):
+            for key in set(mine) | set(theirs):
+                a, b = mine.get(key, [0.0, 0]), theirs.get(key, [0.0, 0])
+                if a[1] != b[1] or abs(a[0] - b[0]) > tolerance:
+                    mismatched.append(key)
+        return mismatched
+
+class ExpenseStorage:
+    """Interface shared by all storage backends"""
+    
+    def add(self, expense):
+        """Store a new expense and return its id"""
+        raise NotImplementedError
+    
+    def add_many(self, expenses):
+        """Store a batch of new expenses in one write; returns how many were stored"""
+        for expense in expenses:
+            self.add(expense)
+        return len(expenses)
+    
+    def delete(self, expense_id):
+        """Delete an expense by id; returns True if it existed"""
+        raise NotImplementedError
+    
+    def get(self, expense_id):
+        """One expense by id, or None"""
+        raise NotImplementedError
+    
+    def update(self, expense_id, changes):
+        """Change fields of one expense; returns True if it existed"""
+        raise NotImplementedError
+    
+    def delete_where(self, **filters):
+        """Delete every expense matching search() filters in one transaction; returns how many"""
+        with self.transaction():
+            return sum(1 for expense in self.search(**filters) if self.delete(expense['id']))
+    
+    def iter_expenses(self, batch_size=10000):
+        """Yield every expense in date order without building one big list where possible"""
+        yield from self.query()
+    
+    def all(self):
+        """Return every expense, oldest first"""
+        return self.query()
+    
+    def page(self, after=None, limit=20, descending=True):
+        """One page of expenses ordered by (date, id), starting just past the `after` key"""
+        expenses = sorted(self.all(), key=lambda e: (e['date'], e['id']), reverse=descending)
+        if after is not None:
+            after = tuple(after)
+            if descending:
+                expenses = [e for e in expenses if (e['date'], e['id']) < after]
+            else:
+                expenses = [e for e in expenses if (e['date'], e['id']) > after]
+        return expenses[:limit]
+    
+    def query(self, start_date=None, end_date=None, category=None, descending=False, limit=None):
+        """Return expenses filtered by inclusive date range and category, sorted by date"""
+        raise NotImplementedError
+    
+    def search(self, start_date=None, end_date=None, min_amount=None, max_amount=None,
+               categories=None, text=None, regex=False, descending=False, limit=None):
+        """Expenses matching every given filter, ordered by (date, id)
+        
+        Dates and amounts are inclusive ranges, categories is a list (any of),
+        text is a description substring, or a regular expression if regex=True.
+        """
+        matches = expense_matcher(min_amount, max_amount, text, regex)
+        results = []
+        for expense in sorted(self.query(start_date, end_date), key=lambda e: (e['date'], e['id']),
+                              reverse=descending):
+            if (not categories or expense['category'] in categories) and matches(expense):
+                results.append(expense)
+                if limit is not None and len(results) >= limit:
+                    break
+        return results
+    
+    def rollups(self):
+        """Totals by (month, category) and by day"""
+        return Rollups.from_expenses(self.all())
+    
+    def check_rollups(self, repair=True):
+        """Compare the rollups with the raw rows; rebuild them if they drifted. Returns mismatched keys"""
+        return []
+    
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group many changes into one commit; on an exception none of them are kept"""
+        yield self
+    
+    def close(self):
+        """Release any open resources"""
+        pass
+
+class JSONStorage(ExpenseStorage):
+    """Original storage format: one JSON array, loaded and rewritten as a whole"""
+    
+    def __init__(self, data_file="expenses.json"):
+        self.data_file = data_file
+        # Working copy while a transaction is open (written once at the end)
+        self.pending = None
+        
+        # Next id to hand out, kept beside the data file so deleting the newest
+        # expense never lets its id come back
+        self.meta_file = data_file + ".meta"
+        self.high_water = None
+    
+    def load(self):
+        """Load expenses from file"""
+        if self.pending is not None:
+            return self.pending
+        if not os.path.exists(self.data_file):
+            return []
+        try:
+            with open(self.data_file, 'r') as f:
+                return json.load(f)
+        except json.JSONDecodeError:
+            return []
+    
+    def save(self, expenses):
+        """Save expenses to file"""
+        if self.pending is not None:
+            self.pending = expenses
+            return
+        # The high-water mark goes first: a crash in between only skips ids, never reuses one
+        if self.high_water is not None:
+            temp_file = self.meta_file + ".tmp"
+            with open(temp_file, 'w') as f:
+                json.dump({'next_id': self.high_water}, f)
+            os.replace(temp_file, self.meta_file)
+        with open(self.data_file, 'w') as f:
+            json.dump(expenses, f, indent=4)
+    
+    @contextlib.contextmanager
+    def transaction(self):
+        if self.pending is not None:
+            yield self
+            return
+        self.pending = self.load()
+        try:
+            yield self
+            expenses = self.pending
+        finally:
+            self.pending = None
+        self.save(expenses)
+    
+    def next_id(self, expenses):
+        """Next integer id; files from older versions may still hold float timestamp ids"""
+        if self.high_water is None:
+            self.high_water = 1
+            try:
+                with open(self.meta_file, 'r') as f:
+                    self.high_water = int(json.load(f)['next_id'])
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+        return max(self.high_water, max((int(e['id']) for e in expenses), default=0) + 1)
+    
+    def add(self, expense):
+        expenses = self.load()
+        expense = dict(expense, id=self.next_id(expenses))
+        self.high_water = expense['id'] + 1
+        expenses.append(expense)
+        self.save(expenses)
+        return expense['id']
+    
+    def add_many(self, expenses):
+        stored = self.load()
+        first_id = self.next_id(stored)
+        for offset, expense in enumerate(expenses):
+            stored.append(dict(expense, id=first_id + offset))
+        self.high_water = first_id + len(expenses)
+        self.save(stored)
+        return len(expenses)
+    
+    def find(self, expenses, expense_id):
+        """Position of an expense in the list, or None"""
+        return next((i for i, e in enumerate(expenses) if e['id'] == expense_id), None)
+    
+    def get(self, expense_id):
+        expenses = self.load()
+        index = self.find(expenses, expense_id)
+        return dict(expenses[index]) if index is not None else None
+    
+    def delete(self, expense_id):
+        expenses = self.load()
+        index = self.find(expenses, expense_id)
+        if index is None:
+            return False
+        del expenses[index]
+        self.save(expenses)
+        return True
+    
+    def update(self, expense_id, changes):
+        expenses = self.load()
+        index = self.find(expenses, expense_id)
+        if index is None:
+            return False
+        expenses[index] = dict(expenses[index], **changes, id=expense_id)
+        self.save(expenses)
+        return True
+    
+    def delete_where(self, **filters):
+        # One pass and one rewrite, however many expenses match
+        doomed = {e['id'] for e in self.search(**filters)}
+        if doomed:
+            self.save([e for e in self.load() if e['id'] not in doomed])
+        return len(doomed)
+    
+    def query(self, start_date=None, end_date=None, category=None, descending=False, limit=None):
+        return filter_expenses(self.load(), start_date, end_date, category, descending, limit)
+
+class SQLiteStorage(ExpenseStorage):
+    """SQLite backend with indexes on date and category"""
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            date TEXT NOT NULL,
+            description TEXT NOT NULL,
+            category TEXT NOT NULL,
+            amount REAL NOT NULL
+        );
+        -- SQLite index entries end with the rowid, so this is also the (date, id) keyset index
+        CREATE INDEX IF NOT EXISTS idx_expenses_date ON expenses (date);
+        CREATE INDEX IF NOT EXISTS idx_expenses_category ON expenses (category, date);
+        CREATE INDEX IF NOT EXISTS idx_expenses_amount ON expenses (amount);
+        CREATE TABLE IF NOT EXISTS rollup_month_category (
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total REAL NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (month, category)
+        );
+        CREATE TABLE IF NOT EXISTS rollup_day (
+            day TEXT PRIMARY KEY,
+            total REAL NOT NULL,
+            count INTEGER NOT NULL
+        );
+    """
+    
+    def __init__(self, db_file="expenses.db", legacy_json="expenses.json"):
+        self.db_file = db_file
+        self.in_transaction = False
+        self.conn = sqlite3.connect(db_file)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.create_function("REGEXP", 2, self.regexp, deterministic=True)
+        self.conn.executescript(self.SCHEMA)
+        
+        # One-shot migration from the old JSON file
+        self.migrated = 0
+        if legacy_json:
+            self.migrated = self.migrate_from_json(legacy_json)
+        
+        # Databases created before rollups existed get them built once
+        if not self.conn.execute("SELECT 1 FROM rollup_day LIMIT 1").fetchone():
+            self.rebuild_rollups()
+    
+    @staticmethod
+    def regexp(pattern, value):
+        """SQL REGEXP operator (patterns are compiled once and cached by the re module)"""
+        return value is not None and re.search(pattern, value, re.IGNORECASE) is not None
+    
+    def migrate_from_json(self, json_file):
+        """Import an existing expenses.json into an empty database, then set the file aside"""
+        if not os.path.exists(json_file):
+            return 0
+        if self.conn.execute("SELECT 1 FROM expenses LIMIT 1").fetchone():
+            return 0
+        
+        expenses = JSONStorage(json_file).load()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO expenses (date, description, category, amount) VALUES (?, ?, ?, ?)",
+                [(e['date'], e['description'], e['category'], e['amount']) for e in expenses]
+            )
+        os.replace(json_file, json_file + ".migrated")
+        return len(expenses)
+    
+    def update_rollups(self, expense, sign):
+        """Add (sign=1) or remove (sign=-1) one expense from the rollup tables"""
+        amount = sign * expense['amount']
+        self.conn.execute(
+            """INSERT INTO rollup_month_category (month, category, total, count) VALUES (?, ?, ?, ?)
+               ON CONFLICT (month, category) DO UPDATE SET total = total + excluded.total, count = count + excluded.count""",
+            (expense['date'][:7], expense['category'], amount, sign)
+        )
+        self.conn.execute(
+            """INSERT INTO rollup_day (day, total, count) VALUES (?, ?, ?)
+               ON CONFLICT (day) DO UPDATE SET total = total + excluded.total, count = count + excluded.count""",
+            (expense['date'], amount, sign)
+        )
+        if sign < 0:
+            self.conn.execute("DELETE FROM rollup_month_category WHERE month = ? AND category = ? AND count <= 0",
+                              (expense['date'][:7], expense['category']))
+            self.conn.execute("DELETE FROM rollup_day WHERE day = ? AND count <= 0", (expense['date'],))
+    
+    def writing(self):
+        """Commit each change on its own, unless a transaction() is open"""
+        return contextlib.nullcontext() if self.in_transaction else self.conn
+    
+    @contextlib.contextmanager
+    def transaction(self):
+        if self.in_transaction:
+            yield self
+            return
+        self.in_transaction = True
+        try:
+            # The connection commits on success and rolls back on an exception
+            with self.conn:
+                yield self
+        finally:
+            self.in_transaction = False
+    
+    def add(self, expense):
+        with self.writing():
+            cursor = self.conn.execute(
+                "INSERT INTO expenses (date, description, category, amount) VALUES (?, ?, ?, ?)",
+                (expense['date'], expense['description'], expense['category'], expense['amount'])
+            )
+            self.update_rollups(expense, 1)
+        return cursor.lastrowid
+    
+    def merge_rollups(self, month_category_rows, day_rows, sign):
+        """Add (sign=1) or subtract (sign=-1) pre-aggregated (key..., total, count) rows"""
+        self.conn.executemany(
+            """INSERT INTO rollup_month_category (month, category, total, count) VALUES (?, ?, ?, ?)
+               ON CONFLICT (month, category) DO UPDATE SET total = total + excluded.total, count = count + excluded.count""",
+            [(month, category, sign * total, sign * count) for month, category, total, count in month_category_rows]
+        )
+        self.conn.executemany(
+            """INSERT INTO rollup_day (day, total, count) VALUES (?, ?, ?)
+               ON CONFLICT (day) DO UPDATE SET total = total + excluded.total, count = count + excluded.count""",
+            [(day, sign * total, sign * count) for day, total, count in day_rows]
+        )
+        if sign < 0:
+            self.conn.execute("DELETE FROM rollup_month_category WHERE count <= 0")
+            self.conn.execute("DELETE FROM rollup_day WHERE count <= 0")
+    
+    def add_many(self, expenses):
+        # One transaction per batch; rollups are aggregated first so each key is upserted once
+        batch = Rollups.from_expenses(expenses)
+        with self.writing():
+            self.conn.executemany(
+                "INSERT INTO expenses (date, description, category, amount) VALUES (?, ?, ?, ?)",
+                [(e['date'], e['description'], e['category'], e['amount']) for e in expenses]
+            )
+            self.merge_rollups([(month, category, total, count)
+                                for (month, category), (total, count) in batch.by_month_category.items()],
+                               [(day, total, count) for day, (total, count) in batch.by_day.items()], 1)
+        return len(expenses)
+    
+    def delete(self, expense_id):
+        with self.writing():
+            row = self.conn.execute("SELECT date, category, amount FROM expenses WHERE id = ?",
+                                    (expense_id,)).fetchone()
+            if row is None:
+                return False
+            self.conn.execute("DELETE FROM expenses WHERE id = ?", (expense_id,))
+            self.update_rollups(dict(row), -1)
+        return True
+    
+    def get(self, expense_id):
+        row = self.conn.execute("SELECT id, date, description, category, amount FROM expenses WHERE id = ?",
+                                (expense_id,)).fetchone()
+        return dict(row) if row is not None else None
+    
+    def update(self, expense_id, changes):
+        with self.writing():
+            row = self.conn.execute("SELECT date, description, category, amount FROM expenses WHERE id = ?",
+                                    (expense_id,)).fetchone()
+            if row is None:
+                return False
+            old = dict(row)
+            new = dict(old, **{field: changes[field] for field in EXPENSE_FIELDS if field in changes and field != 'id'})
+            self.conn.execute("UPDATE expenses SET date = ?, description = ?, category = ?, amount = ? WHERE id = ?",
+                              (new['date'], new['description'], new['category'], new['amount'], expense_id))
+            self.update_rollups(old, -1)
+            self.update_rollups(new, 1)
+        return True
+    
+    def delete_where(self, **filters):
+        # One DELETE statement; the rollups lose the matching rows' grouped totals first
+        where, params = self.where_clause(**filters)
+        with self.writing():
+            month_category_rows = self.conn.execute(
+                f"SELECT substr(date, 1, 7), category, SUM(amount), COUNT(*) FROM expenses{where} GROUP BY 1, 2",
+                params).fetchall()
+            day_rows = self.conn.execute(
+                f"SELECT date, SUM(amount), COUNT(*) FROM expenses{where} GROUP BY date", params).fetchall()
+            self.merge_rollups(month_category_rows, day_rows, -1)
+            cursor = self.conn.execute(f"DELETE FROM expenses{where}", params)
+        return cursor.rowcount
+    
+    def query(self, start_date=None, end_date=None, category=None, descending=False, limit=None):
+        # Filters are pushed down into SQL so the indexes do the work
+        conditions, params = [], []
+        if start_date is not None:
+            conditions.append("date >= ?")
+            params.append(start_date)
+        if end_date is not None:
+            conditions.append("date <= ?")
+            params.append(end_date)
+        if category is not None:
+            conditions.append("category = ?")
+            params.append(category)
+        
+        sql = "SELECT id, date, description, category, amount FROM expenses"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        order = "DESC" if descending else "ASC"
+        sql += f" ORDER BY date {order}, id {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        
+        return [dict(row) for row in self.conn.execute(sql, params)]
+    
+    def where_clause(self, start_date=None, end_date=None, min_amount=None, max_amount=None,
+                     categories=None, text=None, regex=False):
+        """SQL WHERE clause (with leading space, or empty) and parameters for search filters"""
+        # Date ranges use idx_expenses_date and category lists idx_expenses_category;
+        # the planner picks whichever is more selective
+        conditions, params = [], []
+        if start_date is not None:
+            conditions.append("date >= ?")
+            params.append(start_date)
+        if end_date is not None:
+            conditions.append("date <= ?")
+            params.append(end_date)
+        if categories:
+            conditions.append(f"category IN ({', '.join('?' * len(categories))})")
+            params.extend(categories)
+        if min_amount is not None:
+            conditions.append("amount >= ?")
+            params.append(min_amount)
+        if max_amount is not None:
+            conditions.append("amount <= ?")
+            params.append(max_amount)
+        if text and regex:
+            re.compile(text)  # report a bad pattern as re.error, not an SQLite error
+            conditions.append("description REGEXP ?")
+            params.append(text)
+        elif text:
+            conditions.append("description LIKE ? ESCAPE '\\'")
+            params.append('%' + re.sub(r'([%_\\])', r'\\\1', text) + '%')
+        
+        return (" WHERE " + " AND ".join(conditions) if conditions else ""), params
+    
+    def search(self, start_date=None, end_date=None, min_amount=None, max_amount=None,
+               categories=None, text=None, regex=False, descending=False, limit=None):
+        where, params = self.where_clause(start_date, end_date, min_amount, max_amount, categories, text, regex)
+        sql = "SELECT id, date, description, category, amount FROM expenses" + where
+        order = "DESC" if descending else "ASC"
+        sql += f" ORDER BY date {order}, id {order}"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        
+        return [dict(row) for row in self.conn.execute(sql, params)]
+    
+    def page(self, after=None, limit=20, descending=True):
+        # Keyset pagination: seek in the (date, id) index instead of OFFSET, so every page costs the same
+        order, compare = ("DESC", "<") if descending else ("ASC", ">")
+        sql = "SELECT id, date, description, category, amount FROM expenses"
+        params = []
+        if after is not None:
+            sql += f" WHERE (date, id) {compare} (?, ?)"
+            params.extend(after)
+        sql += f" ORDER BY date {order}, id {order} LIMIT ?"
+        params.append(limit)
+        return [dict(row) for row in self.conn.execute(sql, params)]
+    
+    def iter_expenses(self, batch_size=10000):
+        # Streams straight off the date index; a separate cursor keeps other queries usable meanwhile
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id, date, description, category, amount FROM expenses ORDER BY date, id")
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    
+    def read_rollups(self, month_category_sql, day_sql):
+        """Load rollups from two (key..., total, count) queries"""
+        by_month_category = {(row[0], row[1]): [row[2], row[3]] for row in self.conn.execute(month_category_sql)}
+        by_day = {row[0]: [row[1], row[2]] for row in self.conn.execute(day_sql)}
+        return Rollups(by_month_category, by_day)
+    
+    def rollups(self):
+        # O(months x categories + days): the raw expenses are not touched
+        return self.read_rollups("SELECT month, category, total, count FROM rollup_month_category",
+                                 "SELECT day, total, count FROM rollup_day")
+    
+    def rollups_from_rows(self):
+        """Recompute rollups from the raw expense rows"""
+        return self.read_rollups(
+            "SELECT substr(date, 1, 7), category, SUM(amount), COUNT(*) FROM expenses GROUP BY 1, 2",
+            "SELECT date, SUM(amount), COUNT(*) FROM expenses GROUP BY date"
+        )
+    
+    def rebuild_rollups(self):
+        """Replace the rollup tables with totals recomputed from the raw rows"""
+        with self.conn:
+            self.conn.execute("DELETE FROM rollup_month_category")
+            self.conn.execute("DELETE FROM rollup_day")
+            self.conn.execute(
+                """INSERT INTO rollup_month_category (month, category, total, count)
+                   SELECT substr(date, 1, 7), category, SUM(amount), COUNT(*) FROM expenses GROUP BY 1, 2"""
+            )
+            self.conn.execute(
+                "INSERT INTO rollup_day (day, total, count) SELECT date, SUM(amount), COUNT(*) FROM expenses GROUP BY date"
+            )
+    
+    def check_rollups(self, repair=True):
+        mismatched = self.rollups().differences(self.rollups_from_rows())
+        if mismatched and repair:
+            self.rebuild_rollups()
+        return mismatched
+    
+    def close(self):
+        self.conn.close()
+
+class LedgerStorage(ExpenseStorage):
+    """Append-only JSON-lines ledger; deletes are tombstones, compacted in the background"""
+    
+    def __init__(self, ledger_file="expenses.jsonl", legacy_json="expenses.json",
+                 compact_min=100, compact_ratio=0.5):
+        self.ledger_file = ledger_file
+        self.compact_min = compact_min
+        self.compact_ratio = compact_ratio
+        self.lock = threading.RLock()
+        self.compactor = None
+        
+        # Live expenses by id, their rollups, a sorted (date, id) key index
+        # and per-category posting lists of the same keys
+        self.expenses = {}
+        self.rollup = Rollups()
+        self.keys = None
+        self.postings = {}
+        self.tombstones = 0
+        self.next_id = 1
+        self.replay()
+        
+        # Lines held back while a transaction is open
+        self.pending = None
+        
+        self.migrated = 0
+        if legacy_json and not os.path.exists(ledger_file):
+            self.migrated = self.migrate_from_json(legacy_json)
+        
+        # Sorting once after replay is much cheaper than inserting every key in order
+        self.build_indexes()
+        
+        self.handle = open(ledger_file, 'a', encoding='utf-8')
+        self.seal_torn_line()
+    
+    def seal_torn_line(self):
+        """End a torn final line so the next append starts on a fresh line"""
+        if self.handle.tell() == 0:
+            return
+        with open(self.ledger_file, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                self.handle.write('\n')
+                self.handle.flush()
+    
+    def replay(self):
+        """Rebuild the in-memory state from the ledger file"""
+        if not os.path.exists(self.ledger_file):
+            return
+        with open(self.ledger_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-append; everything before it is intact
+                    continue
+                self.apply(record)
+    
+    def apply(self, record):
+        """Apply one ledger record to the in-memory state"""
+        if record.get('op') == 'meta':
+            # Written by compaction: ids of compacted-away expenses stay used
+            self.next_id = max(self.next_id, record['next_id'])
+        elif record.get('op') == 'delete':
+            expense = self.expenses.pop(record['id'], None)
+            if expense is not None:
+                self.forget_key(expense)
+                self.rollup.remove(expense)
+                self.tombstones += 1
+        else:
+            expense = {field: record[field] for field in EXPENSE_FIELDS}
+            if expense['id'] in self.expenses:
+                # An update: the earlier line for this id is now dead weight, like a tombstone
+                self.forget_key(self.expenses[expense['id']])
+                self.rollup.remove(self.expenses[expense['id']])
+                self.tombstones += 1
+            self.expenses[expense['id']] = expense
+            self.rollup.add(expense)
+            if self.keys is not None:
+                key = (expense['date'], expense['id'])
+                bisect.insort(self.keys, key)
+                bisect.insort(self.postings.setdefault(expense['category'], []), key)
+            if isinstance(expense['id'], int):
+                self.next_id = max(self.next_id, expense['id'] + 1)
+    
+    def build_indexes(self):
+        """Sort the key index and the category posting lists from scratch"""
+        self.keys = sorted((e['date'], e['id']) for e in self.expenses.values())
+        self.postings = {}
+        for key in self.keys:
+            self.postings.setdefault(self.expenses[key[1]]['category'], []).append(key)
+    
+    def forget_key(self, expense):
+        """Remove an expense from the sorted key index and its posting list"""
+        if self.keys is not None:
+            key = (expense['date'], expense['id'])
+            for keys in (self.keys, self.postings.get(expense['category'], [])):
+                index = bisect.bisect_left(keys, key)
+                if index < len(keys) and keys[index] == key:
+                    del keys[index]
+    
+    def migrate_from_json(self, json_file):
+        """Write an existing expenses.json out as the first ledger, then set the file aside"""
+        if not os.path.exists(json_file):
+            return 0
+        
+        expenses = JSONStorage(json_file).load()
+        temp_file = self.ledger_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            for expense in expenses:
+                record = dict(expense, op='add', id=self.next_id)
+                f.write(json.dumps(record, separators=(',', ':')) + '\n')
+                self.apply(record)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, self.ledger_file)
+        os.replace(json_file, json_file + ".migrated")
+        return len(expenses)
+    
+    def write_lines(self, lines):
+        """Append lines and make them durable (or hold them until the open transaction ends)"""
+        if self.pending is not None:
+            self.pending.extend(lines)
+            return
+        self.handle.write(''.join(lines))
+        self.handle.flush()
+        os.fsync(self.handle.fileno())
+    
+    def append(self, record):
+        """Append one record and make it durable before returning"""
+        self.write_lines([json.dumps(record, separators=(',', ':')) + '\n'])
+    
+    @contextlib.contextmanager
+    def transaction(self):
+        with self.lock:
+            if self.pending is not None:
+                yield self
+                return
+            self.pending = []
+            try:
+                yield self
+            except BaseException:
+                # Nothing was written: drop the held lines and rebuild the state from the file
+                self.pending = None
+                self.reload()
+                raise
+            lines, self.pending = self.pending, None
+            self.write_lines(lines)
+        self.maybe_compact()
+    
+    def reload(self):
+        """Discard the in-memory state and replay the ledger file"""
+        self.expenses = {}
+        self.rollup = Rollups()
+        self.keys = None
+        self.postings = {}
+        self.tombstones = 0
+        self.next_id = 1
+        self.replay()
+        self.build_indexes()
+    
+    def add(self, expense):
+        with self.lock:
+            record = {field: expense[field] for field in EXPENSE_FIELDS if field != 'id'}
+            record = dict(record, op='add', id=self.next_id)
+            self.append(record)
+            self.apply(record)
+            return record['id']
+    
+    def add_many(self, expenses):
+        with self.lock:
+            records = []
+            for expense in expenses:
+                record = {field: expense[field] for field in EXPENSE_FIELDS if field != 'id'}
+                records.append(dict(record, op='add', id=self.next_id + len(records)))
+            
+            # One write and one fsync for the whole batch
+            self.write_lines([json.dumps(r, separators=(',', ':')) + '\n' for r in records])
+            
+            # Large batches: append the keys and re-sort once instead of inserting one by one
+            keys, self.keys = self.keys, None
+            for record in records:
+                self.apply(record)
+            keys.extend((r['date'], r['id']) for r in records)
+            keys.sort()
+            touched = set()
+            for record in records:
+                self.postings.setdefault(record['category'], []).append((record['date'], record['id']))
+                touched.add(record['category'])
+            for category in touched:
+                self.postings[category].sort()
+            self.keys = keys
+        return len(records)
+    
+    def delete(self, expense_id):
+        with self.lock:
+            if expense_id not in self.expenses:
+                return False
+            record = {'op': 'delete', 'id': expense_id}
+            self.append(record)
+            self.apply(record)
+        self.maybe_compact()
+        return True
+    
+    def get(self, expense_id):
+        with self.lock:
+            expense = self.expenses.get(expense_id)
+            return dict(expense) if expense is not None else None
+    
+    def update(self, expense_id, changes):
+        # Appends the full new version of the record; replay keeps the last one
+        with self.lock:
+            if expense_id not in self.expenses:
+                return False
+            record = dict(self.expenses[expense_id],
+                          **{field: changes[field] for field in EXPENSE_FIELDS if field in changes and field != 'id'})
+            record = dict(record, op='add', id=expense_id)
+            self.append(record)
+            self.apply(record)
+        self.maybe_compact()
+        return True
+    
+    def delete_where(self, **filters):
+        # Matches come from the indexes; all tombstones go out in one write and one fsync
+        with self.lock:
+            records = [{'op': 'delete', 'id': e['id']} for e in self.search(**filters)]
+            if not records:
+                return 0
+            self.write_lines([json.dumps(r, separators=(',', ':')) + '\n' for r in records])
+            
+            # Removing many keys one by one shifts the index lists each time; rebuilding is cheaper
+            rebuild = len(records) > 1000
+            if rebuild:
+                self.keys = None
+            for record in records:
+                self.apply(record)
+            if rebuild:
+                self.build_indexes()
+        self.maybe_compact()
+        return len(records)
+    
+    def query(self, start_date=None, end_date=None, category=None, descending=False, limit=None):
+        return self.search(start_date, end_date, categories=[category] if category is not None else None,
+                           descending=descending, limit=limit)
+    
+    def search(self, start_date=None, end_date=None, min_amount=None, max_amount=None,
+               categories=None, text=None, regex=False, descending=False, limit=None):
+        matches = expense_matcher(min_amount, max_amount, text, regex)
+        with self.lock:
+            # Candidates: the date range of the key index, or of each requested category's
+            # posting list (merged in order); only those rows are looked at
+            sources = [self.postings.get(c, []) for c in sorted(set(categories))] if categories else [self.keys]
+            ranges = []
+            for keys in sources:
+                lo = bisect.bisect_left(keys, (start_date,)) if start_date is not None else 0
+                hi = bisect.bisect_right(keys, (end_date, float('inf'))) if end_date is not None else len(keys)
+                order = range(hi - 1, lo - 1, -1) if descending else range(lo, hi)
+                # map() binds this posting list now; a generator would see only the last one
+                ranges.append(map(keys.__getitem__, order))
+            candidates = ranges[0] if len(ranges) == 1 else heapq.merge(*ranges, reverse=descending)
+            
+            results = []
+            for key in candidates:
+                expense = self.expenses[key[1]]
+                if matches(expense):
+                    results.append(dict(expense))
+                    if limit is not None and len(results) >= limit:
+                        break
+            return results
+    
+    def page(self, after=None, limit=20, descending=True):
+        # Binary search in the sorted key index, then copy only the rows on this page
+        with self.lock:
+            if descending:
+                end = len(self.keys) if after is None else bisect.bisect_left(self.keys, tuple(after))
+                keys = self.keys[max(0, end - limit):end][::-1]
+            else:
+                start = 0 if after is None else bisect.bisect_right(self.keys, tuple(after))
+                keys = self.keys[start:start + limit]
+            return [dict(self.expenses[key[1]]) for key in keys]
+    
+    def iter_expenses(self, batch_size=10000):
+        # Keyset walk over the key index: only one batch is copied at a time, and
+        # writes between batches cannot make it skip or repeat a row
+        after = None
+        while True:
+            batch = self.page(after, limit=batch_size, descending=False)
+            if not batch:
+                return
+            yield from batch
+            after = (batch[-1]['date'], batch[-1]['id'])
+    
+    def rollups(self):
+        with self.lock:
+            return Rollups({key: list(value) for key, value in self.rollup.by_month_category.items()},
+                           {key: list(value) for key, value in self.rollup.by_day.items()})
+    
+    def check_rollups(self, repair=True):
+        with self.lock:
+            rebuilt = Rollups.from_expenses(list(self.expenses.values()))
+            mismatched = self.rollup.differences(rebuilt)
+            if mismatched and repair:
+                self.rollup = rebuilt
+        return mismatched
+    
+    def maybe_compact(self):
+        """Start a background compaction once tombstones make up enough of the file"""
+        with self.lock:
+            if self.compactor is not None and self.compactor.is_alive():
+                return
+            if self.tombstones < self.compact_min:
+                return
+            if self.tombstones < self.compact_ratio * (len(self.expenses) + self.tombstones):
+                return
+            self.compactor = threading.Thread(target=self.compact, daemon=True)
+            self.compactor.start()
+    
+    def compact(self):
+        """Rewrite the ledger with only live expenses, without blocking writers for long"""
+        # Snapshot the live records and how far the file had got
+        with self.lock:
+            self.handle.flush()
+            snapshot = list(self.expenses.values())
+            offset = self.handle.tell()
+            tombstones = self.tombstones
+            next_id = self.next_id
+        
+        temp_file = self.ledger_file + ".compact"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'op': 'meta', 'next_id': next_id}, separators=(',', ':')) + '\n')
+            for expense in snapshot:
+                f.write(json.dumps(dict(expense, op='add'), separators=(',', ':')) + '\n')
+            f.flush()
+            
+            # Copy anything appended since the snapshot, then swap files while holding the lock
+            with self.lock:
+                self.handle.flush()
+                with open(self.ledger_file, 'r', encoding='utf-8') as ledger:
+                    ledger.seek(offset)
+                    tail = ledger.read()
+                f.write(tail)
+                f.flush()
+                os.fsync(f.fileno())
+                
+                self.handle.close()
+                os.replace(temp_file, self.ledger_file)
+                self.handle = open(self.ledger_file, 'a', encoding='utf-8')
+                self.tombstones -= tombstones
+    
+    def close(self):
+        with self.lock:
+            compactor = self.compactor
+        if compactor is not None:
+            compactor.join()
+        self.handle.close()
+
+def open_storage(backend="sqlite"):
+    """Create a storage backend by name"""
+    if backend == "sqlite":
+        return SQLiteStorage()
+    if backend == "json":
+        return JSONStorage()
+    if backend == "ledger":
+        return LedgerStorage()
+    raise ValueError(f"Unknown storage backend: {backend}")
@@ -3,29 +3,36 @@ Expense Tracker - Track daily expenses with charts
 Features:
 - Add expenses with category and amount
 - View all expenses
-- Filter by date range or category
+- Search by date range, amount range, categories and description text/regex
 - Calculate total spending
 - Visualize expenses with charts (pie chart by category, line chart over time)
-- Export data to CSV
+- Headless PNG/SVG chart output, cached until the data changes
+- Streaming CSV import and export (optionally gzipped)
 - Monthly/yearly summaries
+- Indexed SQLite storage (expenses.json is migrated automatically)
+- Append-only JSON-lines ledger storage for systems without SQLite
+- Rollup tables (by month and category, and by day) kept up to date on every change
 """
 
-import json
 import os
+import re
+import sys
+import json
+import time
 from datetime import datetime, timedelta
 import csv
+import argparse
 
-try:
-    import matplotlib.pyplot as plt
-    MATPLOTLIB_AVAILABLE = True
-except ImportError:
-    MATPLOTLIB_AVAILABLE = False
-    print("Note: matplotlib not installed. Charts will not be available.")
-    print("Install with: pip install matplotlib")
+from expense_storage import open_storage
+from expense_csv import import_csv, export_csv, parse_row, rate
+from expense_charts import render_chart, display_available, CHART_KINDS, CHART_FORMATS
 
 class ExpenseTracker:
-    def __init__(self):
-        self.data_file = "expenses.json"
+    def __init__(self, backend="sqlite"):
+        # Storage backend: 'sqlite' (default), 'ledger' (JSON lines) or 'json' (original format)
+        self.storage = open_storage(backend)
+        if getattr(self.storage, 'migrated', 0):
+            print(f"✓ Migrated {self.storage.migrated} expense(s) from expenses.json to {backend} storage")
         self.categories = [
             "Food & Dining",
             "Transportation",
@@ -37,21 +44,12 @@ class ExpenseTracker:
             "Travel",
             "Other"
         ]
+        # Rows per page in the expense listing
+        self.page_size = 20
     
     def load_expenses(self):
-        """Load expenses from file"""
-        if not os.path.exists(self.data_file):
-            return []
-        try:
-            with open(self.data_file, 'r') as f:
-                return json.load(f)
-        except json.JSONDecodeError:
-            return []
-    
-    def save_expenses(self, expenses):
-        """Save expenses to file"""
-        with open(self.data_file, 'w') as f:
-            json.dump(expenses, f, indent=4)
+        """Load all expenses from storage"""
+        return self.storage.all()
     
     def add_expense(self):
         """Add a new expense"""
@@ -103,43 +101,66 @@ class ExpenseTracker:
         
         # Create expense entry
         expense = {
-            'id': datetime.now().timestamp(),
             'date': date,
             'description': description,
             'category': category,
             'amount': amount
         }
         
-        # Save expense
-        expenses = self.load_expenses()
-        expenses.append(expense)
-        self.save_expenses(expenses)
+        # Save expense (a single append; the backend assigns the id)
+        self.storage.add(expense)
         
         print(f"\n✓ Expense added successfully! (${amount:.2f} for {category})")
     
     def view_expenses(self):
-        """View all expenses"""
-        expenses = self.load_expenses()
-        
-        if not expenses:
-            print("\n✗ No expenses recorded yet.")
-            return
-        
-        print("\n" + "="*90)
-        print("ALL EXPENSES".center(90))
-        print("="*90)
-        print(f"{'Date':<12} {'Description':<25} {'Category':<20} {'Amount':>10}")
-        print("-"*90)
-        
-        total = 0
-        for expense in sorted(expenses, key=lambda x: x['date'], reverse=True):
-            print(f"{expense['date']:<12} {expense['description'][:24]:<25} "
-                  f"{expense['category']:<20} ${expense['amount']:>9.2f}")
-            total += expense['amount']
+        """View all expenses, one page at a time (newest first)"""
+        # Keys (date, id) of the row just before each visited page; None = start
+        page_starts = [None]
+        overall = sum(self.storage.rollups().category_totals().values())
         
-        print("-"*90)
-        print(f"{'TOTAL':<57} ${total:>9.2f}")
-        print("="*90)
+        while True:
+            # Fetch one extra row to know whether there is a next page
+            rows = self.storage.page(after=page_starts[-1], limit=self.page_size + 1)
+            has_next = len(rows) > self.page_size
+            rows = rows[:self.page_size]
+            
+            if not rows:
+                print("\n✗ No expenses recorded yet.")
+                return
+            
+            print("\n" + "="*90)
+            print(f"ALL EXPENSES - PAGE {len(page_starts)}".center(90))
+            print("="*90)
+            print(f"{'Date':<12} {'Description':<25} {'Category':<20} {'Amount':>10}")
+            print("-"*90)
+            
+            total = 0
+            for expense in rows:
+                print(f"{expense['date']:<12} {expense['description'][:24]:<25} "
+                      f"{expense['category']:<20} ${expense['amount']:>9.2f}")
+                total += expense['amount']
+            
+            print("-"*90)
+            print(f"{'PAGE TOTAL':<57} ${total:>9.2f}")
+            print(f"{'TOTAL':<57} ${overall:>9.2f}")
+            print("="*90)
+            
+            options = []
+            if has_next:
+                options.append("[n]ext")
+            if len(page_starts) > 1:
+                options.append("[p]revious")
+            if not options:
+                return
+            
+            choice = input(f"{', '.join(options)}, or Enter to return: ").strip().lower()
+            if choice == 'n' and has_next:
+                last = rows[-1]
+                page_starts.append((last['date'], last['id']))
+            elif choice == 'p' and len(page_starts) > 1:
+                page_starts.pop()
+            else:
+                return
     
     def filter_by_category(self):
         """Filter expenses by category"""
@@ -159,8 +180,7 @@ class ExpenseTracker:
             print("Invalid input.")
             return
         
-        expenses = self.load_expenses()
-        filtered = [e for e in expenses if e['category'] == category]
+        filtered = self.storage.query(category=category, descending=True)
         
         if not filtered:
             print(f"\n✗ No expenses found for category: {category}")
@@ -173,7 +193,7 @@ class ExpenseTracker:
         print("-"*90)
         
         total = 0
-        for expense in sorted(filtered, key=lambda x: x['date'], reverse=True):
+        for expense in filtered:
             print(f"{expense['date']:<12} {expense['description'][:39]:<40} ${expense['amount']:>9.2f}")
             total += expense['amount']
         
@@ -181,6 +201,77 @@ class ExpenseTracker:
         print(f"{'TOTAL':<52} ${total:>9.2f}")
         print("="*90)
     
+    def search_expenses(self):
+        """Search expenses by any combination of date range, amount range, category and text"""
+        print("\n=== Search Expenses ===")
+        print("Press Enter to skip a filter.")
+        
+        filters = {}
+        try:
+            for key, prompt in (('start_date', "From date (YYYY-MM-DD): "), ('end_date', "To date (YYYY-MM-DD): ")):
+                value = input(prompt).strip()
+                if value:
+                    filters[key] = datetime.strptime(value, "%Y-%m-%d").strftime("%Y-%m-%d")
+            for key, prompt in (('min_amount', "Minimum amount ($): "), ('max_amount', "Maximum amount ($): ")):
+                value = input(prompt).strip()
+                if value:
+                    filters[key] = float(value)
+        except ValueError:
+            print("✗ Invalid date or amount.")
+            return
+        
+        print("\nCategories:")
+        for idx, cat in enumerate(self.categories, 1):
+            print(f"{idx}. {cat}")
+        choices = input("Categories (e.g. 1,3): ").replace(',', ' ').split()
+        try:
+            filters['categories'] = [self.categories[int(c) - 1] for c in choices if 1 <= int(c) <= len(self.categories)]
+        except ValueError:
+            print("✗ Invalid category selection.")
+            return
+        
+        text = input("Description contains (prefix with re: for a regular expression): ").strip()
+        if text.startswith("re:"):
+            filters['text'], filters['regex'] = text[3:], True
+        elif text:
+            filters['text'] = text
+        
+        self.print_search_results(filters)
+    
+    def print_search_results(self, filters, max_rows=100, show_ids=False):
+        """Run a search and print up to max_rows matches, newest first"""
+        try:
+            results = self.storage.search(descending=True, limit=max_rows + 1, **filters)
+        except re.error as e:
+            print(f"✗ Invalid regular expression: {e}")
+            return False
+        
+        if not results:
+            print("\n✗ No matching expenses.")
+            return False
+        
+        # Ids are only needed when the listing feeds a later delete
+        id_header = f"{'ID':>8} " if show_ids else ""
+        print("\n" + "="*90)
+        print("SEARCH RESULTS".center(90))
+        print("="*90)
+        print(f"{id_header}{'Date':<12} {'Description':<25} {'Category':<20} {'Amount':>10}")
+        print("-"*90)
+        
+        total = 0
+        for expense in results[:max_rows]:
+            id_column = f"{expense['id']:>8} " if show_ids else ""
+            print(f"{id_column}{expense['date']:<12} {expense['description'][:24]:<25} "
+                  f"{expense['category']:<20} ${expense['amount']:>9.2f}")
+            total += expense['amount']
+        
+        print("-"*90)
+        print(f"{'TOTAL (shown)':<57} ${total:>9.2f}")
+        if len(results) > max_rows:
+            print(f"Showing the newest {max_rows} matches - narrow the filters to see more.")
+        print("="*90)
+        return True
+    
     def monthly_summary(self):
         """Show monthly summary"""
         print("\n=== Monthly Summary ===")
@@ -196,23 +287,21 @@ class ExpenseTracker:
         else:
             target_month = datetime.now().strftime("%Y-%m")
         
-        expenses = self.load_expenses()
-        monthly_expenses = [e for e in expenses if e['date'].startswith(target_month)]
-        
-        if not monthly_expenses:
-            print(f"\n✗ No expenses found for {target_month}")
-            return
+        self.print_summary(target_month)
+    
+    def print_summary(self, target_month=None):
+        """Print category totals for one month (YYYY-MM), or for all time"""
+        # Category totals come straight from the (month, category) rollup
+        category_totals = self.storage.rollups().category_totals(month=target_month)
         
-        # Calculate category totals
-        category_totals = {}
-        for expense in monthly_expenses:
-            cat = expense['category']
-            category_totals[cat] = category_totals.get(cat, 0) + expense['amount']
+        if not category_totals:
+            print(f"\n✗ No expenses found for {target_month or 'any month'}")
+            return False
         
         total = sum(category_totals.values())
         
         print("\n" + "="*60)
-        print(f"SUMMARY FOR {target_month}".center(60))
+        print(f"SUMMARY FOR {target_month or 'ALL TIME'}".center(60))
         print("="*60)
         print(f"{'Category':<30} {'Amount':>15} {'Percentage':>10}")
         print("-"*60)
@@ -225,17 +314,11 @@ class ExpenseTracker:
         print("-"*60)
         print(f"{'TOTAL':<30} ${total:>14.2f}")
         print("="*60)
+        return True
     
     def visualize_expenses(self):
         """Create charts for expenses"""
-        if not MATPLOTLIB_AVAILABLE:
-            print("\n✗ matplotlib not installed. Cannot create charts.")
-            print("Install with: pip install matplotlib")
-            return
-        
-        expenses = self.load_expenses()
-        
-        if not expenses:
+        if not self.storage.rollups().by_day:
             print("\n✗ No expenses to visualize.")
             return
         
@@ -245,116 +328,150 @@ class ExpenseTracker:
         print("3. Bar Chart (Monthly Comparison)")
         
         choice = input("\nSelect chart type (1-3): ").strip()
+        if choice not in ('1', '2', '3'):
+            print("Invalid choice.")
+            return
         
-        if choice == '1':
-            self._pie_chart(expenses)
-        elif choice == '2':
-            self._line_chart(expenses)
-        elif choice == '3':
-            self._bar_chart(expenses)
+        # Without a display the chart can only be saved to a file
+        if display_available():
+            fmt = input("Save as png/svg, or press Enter to display: ").strip().lower() or None
         else:
-            print("Invalid choice.")
+            fmt = input("No display found. Save as png or svg? [png]: ").strip().lower() or 'png'
+        if fmt is not None and fmt not in CHART_FORMATS:
+            print("Invalid format.")
+            return
+        
+        self.save_chart(CHART_KINDS[int(choice) - 1], fmt)
+    
+    def save_chart(self, kind, fmt=None):
+        """Render a chart from the rollups, to a file (fmt) or a window (fmt=None)"""
+        try:
+            path, cached = render_chart(kind, self.storage.rollups(), fmt)
+        except ImportError:
+            print("\n✗ matplotlib not installed. Cannot create charts.")
+            print("Install with: pip install matplotlib")
+            return None
+        
+        if path is None:
+            print("✓ Chart displayed!")
+        elif cached:
+            print(f"✓ Chart unchanged, reusing: {path}")
+        else:
+            print(f"✓ Chart saved to: {path}")
+        return path
+    
+    def check_rollups(self):
+        """Verify the rollups against the raw expenses and rebuild them if they drifted"""
+        mismatched = self.storage.check_rollups(repair=True)
+        if mismatched:
+            print(f"✗ {len(mismatched)} rollup total(s) did not match the expenses - rebuilt from raw rows")
+        else:
+            print("✓ Rollups match the expenses")
+        return not mismatched
+    
+    def run_batch(self, lines):
+        """Apply JSON-lines operations in one transaction; any invalid line cancels the whole batch
+        
+        Each line is {"op": "add", "date": ..., "description": ..., "category": ..., "amount": ...}
+        ("op" defaults to add), {"op": "update", "id": ..., <fields to change>} or {"op": "delete", "id": ...}.
+        Blank lines and # comments are skipped. Returns (added, updated, deleted, missing) counts.
+        """
+        added = updated = deleted = missing = 0
+        with self.storage.transaction():
+            for number, line in enumerate(lines, 1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    operation = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f"line {number}: not valid JSON ({e.msg})")
+                if not isinstance(operation, dict):
+                    raise ValueError(f"line {number}: expected a JSON object")
+                
+                op = operation.get('op', 'add')
+                if op == 'add':
+                    expense = parse_row(operation)
+                    if expense is None:
+                        raise ValueError(f"line {number}: needs a YYYY-MM-DD date and a positive amount")
+                    self.storage.add(expense)
+                    added += 1
+                elif op == 'delete':
+                    if 'id' not in operation:
+                        raise ValueError(f"line {number}: delete needs an id")
+                    if self.storage.delete(operation['id']):
+                        deleted += 1
+                    else:
+                        missing += 1
+                elif op == 'update':
+                    if 'id' not in operation:
+                        raise ValueError(f"line {number}: update needs an id")
+                    changes = {k: v for k, v in operation.items() if k not in ('op', 'id')}
+                    error = self.update_expense(operation['id'], changes)
+                    if error == "Expense not found":
+                        missing += 1
+                    elif error:
+                        raise ValueError(f"line {number}: {error}")
+                    else:
+                        updated += 1
+                else:
+                    raise ValueError(f"line {number}: unknown op '{op}'")
+        return added, updated, deleted, missing
     
-    def _pie_chart(self, expenses):
-        """Create pie chart by category"""
-        category_totals = {}
-        for expense in expenses:
-            cat = expense['category']
-            category_totals[cat] = category_totals.get(cat, 0) + expense['amount']
-        
-        categories = list(category_totals.keys())
-        amounts = list(category_totals.values())
-        
-        plt.figure(figsize=(10, 8))
-        plt.pie(amounts, labels=categories, autopct='%1.1f%%', startangle=90)
-        plt.title('Expenses by Category', fontsize=16, fontweight='bold')
-        plt.axis('equal')
-        plt.tight_layout()
-        plt.show()
-        print("✓ Chart displayed!")
-    
-    def _line_chart(self, expenses):
-        """Create line chart over time"""
-        # Sort by date
-        sorted_expenses = sorted(expenses, key=lambda x: x['date'])
-        
-        # Group by date
-        date_totals = {}
-        for expense in sorted_expenses:
-            date = expense['date']
-            date_totals[date] = date_totals.get(date, 0) + expense['amount']
-        
-        dates = list(date_totals.keys())
-        amounts = list(date_totals.values())
-        
-        plt.figure(figsize=(12, 6))
-        plt.plot(dates, amounts, marker='o', linewidth=2, markersize=6)
-        plt.xlabel('Date', fontsize=12)
-        plt.ylabel('Amount ($)', fontsize=12)
-        plt.title('Expenses Over Time', fontsize=16, fontweight='bold')
-        plt.xticks(rotation=45)
-        plt.grid(True, alpha=0.3)
-        plt.tight_layout()
-        plt.show()
-        print("✓ Chart displayed!")
-    
-    def _bar_chart(self, expenses):
-        """Create bar chart for monthly comparison"""
-        # Group by month
-        monthly_totals = {}
-        for expense in expenses:
-            month = expense['date'][:7]  # YYYY-MM
-            monthly_totals[month] = monthly_totals.get(month, 0) + expense['amount']
-        
-        months = sorted(monthly_totals.keys())
-        amounts = [monthly_totals[m] for m in months]
-        
-        plt.figure(figsize=(12, 6))
-        plt.bar(months, amounts, color='skyblue', edgecolor='navy')
-        plt.xlabel('Month', fontsize=12)
-        plt.ylabel('Total Amount ($)', fontsize=12)
-        plt.title('Monthly Expenses Comparison', fontsize=16, fontweight='bold')
-        plt.xticks(rotation=45)
-        plt.grid(True, axis='y', alpha=0.3)
-        plt.tight_layout()
-        plt.show()
-        print("✓ Chart displayed!")
+    def update_expense(self, expense_id, changes):
+        """Validate and apply changes to one expense; returns an error message or None"""
+        unknown = set(changes) - {'date', 'description', 'category', 'amount'}
+        if unknown:
+            return f"Unknown field(s): {', '.join(sorted(unknown))}"
+        current = self.storage.get(expense_id)
+        if current is None:
+            return "Expense not found"
+        expense = parse_row(dict(current, **changes))
+        if expense is None:
+            return "Needs a YYYY-MM-DD date and a positive amount"
+        self.storage.update(expense_id, expense)
+        return None
     
     def export_to_csv(self):
-        """Export expenses to CSV"""
-        expenses = self.load_expenses()
-        
-        if not expenses:
+        """Export expenses to CSV (streamed in date order, optionally gzipped)"""
+        if not self.storage.query(limit=1):
             print("\n✗ No expenses to export.")
             return
         
+        compress = input("Compress with gzip? (y/N): ").strip().lower() == 'y'
         filename = f"expenses_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+        if compress:
+            filename += ".gz"
         
-        with open(filename, 'w', newline='') as csvfile:
-            fieldnames = ['date', 'description', 'category', 'amount']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            writer.writeheader()
-            for expense in sorted(expenses, key=lambda x: x['date']):
-                writer.writerow({
-                    'date': expense['date'],
-                    'description': expense['description'],
-                    'category': expense['category'],
-                    'amount': expense['amount']
-                })
+        rows, seconds = export_csv(self.storage, filename)
+        print(f"\n✓ {rows} expenses exported to: {filename} ({rate(rows, seconds)})")
+    
+    def import_from_csv(self):
+        """Import expenses from a CSV (or .csv.gz) file"""
+        path = input("\nCSV file to import (columns: date, description, category, amount): ").strip()
+        if not os.path.exists(path):
+            print(f"✗ File not found: {path}")
+            return
+        
+        try:
+            imported, skipped, seconds = import_csv(self.storage, path)
+        except (OSError, csv.Error, UnicodeDecodeError) as e:
+            print(f"✗ Import failed: {e}")
+            return
         
-        print(f"\n✓ Expenses exported to: {filename}")
+        print(f"\n✓ Imported {imported} expenses in {seconds:.1f}s ({rate(imported, seconds)})")
+        if skipped:
+            print(f"  Skipped {skipped} row(s) with a missing/invalid date or a non-positive amount")
     
     def delete_expense(self):
         """Delete an expense"""
-        expenses = self.load_expenses()
+        recent = self.storage.query(descending=True, limit=10)
         
-        if not expenses:
+        if not recent:
             print("\n✗ No expenses to delete.")
             return
         
         print("\n=== Recent Expenses ===")
-        recent = sorted(expenses, key=lambda x: x['date'], reverse=True)[:10]
         
         for idx, expense in enumerate(recent, 1):
             print(f"{idx}. {expense['date']} - {expense['description']} "
@@ -366,8 +483,7 @@ class ExpenseTracker:
                 return
             if 1 <= choice <= len(recent):
                 expense_to_delete = recent[choice - 1]
-                expenses = [e for e in expenses if e['id'] != expense_to_delete['id']]
-                self.save_expenses(expenses)
+                self.storage.delete(expense_to_delete['id'])
                 print(f"✓ Expense deleted successfully!")
             else:
                 print("Invalid choice.")
@@ -382,11 +498,13 @@ class ExpenseTracker:
         print("1. Add Expense")
         print("2. View All Expenses")
         print("3. Filter by Category")
-        print("4. Monthly Summary")
-        print("5. Visualize Expenses (Charts)")
-        print("6. Export to CSV")
-        print("7. Delete Expense")
-        print("8. Exit")
+        print("4. Search Expenses")
+        print("5. Monthly Summary")
+        print("6. Visualize Expenses (Charts)")
+        print("7. Export to CSV")
+        print("8. Import from CSV")
+        print("9. Delete Expense")
+        print("10. Exit")
         print("="*50)
     
     def run(self):
@@ -398,7 +516,7 @@ class ExpenseTracker:
         
         while True:
             self.show_menu()
-            choice = input("\nEnter your choice (1-8): ").strip()
+            choice = input("\nEnter your choice (1-10): ").strip()
             
             if choice == '1':
                 self.add_expense()
@@ -407,19 +525,198 @@ class ExpenseTracker:
             elif choice == '3':
                 self.filter_by_category()
             elif choice == '4':
-                self.monthly_summary()
+                self.search_expenses()
             elif choice == '5':
-                self.visualize_expenses()
+                self.monthly_summary()
             elif choice == '6':
-                self.export_to_csv()
+                self.visualize_expenses()
             elif choice == '7':
-                self.delete_expense()
+                self.export_to_csv()
             elif choice == '8':
+                self.import_from_csv()
+            elif choice == '9':
+                self.delete_expense()
+            elif choice == '10':
+                self.storage.close()
                 print("\n👋 Goodbye! Keep tracking your expenses!")
                 break
             else:
                 print("✗ Invalid choice. Please try again.")
 
+def parse_id(value):
+    """Expense id from the command line (integers; old JSON files may still hold float timestamp ids)"""
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+# Search filters shared by 'list' and 'delete-where'
+FILTER_KEYS = ('start_date', 'end_date', 'min_amount', 'max_amount', 'categories', 'text')
+
+def add_filter_arguments(parser):
+    """Add the search filter options to a subcommand"""
+    parser.add_argument('--from', dest='start_date', metavar='DATE', help="first date (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='end_date', metavar='DATE', help="last date (YYYY-MM-DD)")
+    parser.add_argument('--min', dest='min_amount', type=float, metavar='AMOUNT', help="minimum amount")
+    parser.add_argument('--max', dest='max_amount', type=float, metavar='AMOUNT', help="maximum amount")
+    parser.add_argument('--category', dest='categories', action='append', metavar='NAME',
+                        help="category to include (repeatable)")
+    parser.add_argument('--match', dest='text', metavar='TEXT', help="description substring")
+    parser.add_argument('--regex', action='store_true', help="treat --match as a regular expression")
+
+def get_filters(args):
+    """Search filters given on the command line"""
+    filters = {key: getattr(args, key) for key in FILTER_KEYS if getattr(args, key) is not None}
+    if filters.get('text'):
+        filters['regex'] = args.regex
+    return filters
+
+def build_parser():
+    """Command line options; without a command the interactive menu starts"""
+    parser = argparse.ArgumentParser(description="Track daily expenses with charts")
+    parser.add_argument('--storage', choices=['sqlite', 'ledger', 'json'], default='sqlite',
+                        help="storage backend (default: sqlite; use ledger where SQLite is unavailable)")
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND')
+    
+    add = commands.add_parser('add', help="add one expense")
+    add.add_argument('amount', type=float, help="amount in dollars")
+    add.add_argument('description', help="what the money was spent on")
+    add.add_argument('--category', default="Other", help="category (default: Other)")
+    add.add_argument('--date', default=datetime.now().strftime("%Y-%m-%d"), help="YYYY-MM-DD (default: today)")
+    
+    listing = commands.add_parser('list', help="list expenses (newest first), optionally filtered")
+    add_filter_arguments(listing)
+    listing.add_argument('--limit', type=int, default=100, help="most rows to print (default: 100)")
+    listing.add_argument('--json', action='store_true', help="print one JSON object per line instead of a table")
+    
+    summary = commands.add_parser('summary', help="category totals for a month")
+    summary.add_argument('--month', default=datetime.now().strftime("%Y-%m"),
+                         help="YYYY-MM (default: current month) or 'all'")
+    
+    export = commands.add_parser('export', help="export all expenses to CSV")
+    export.add_argument('file', help="file to write ('.gz' compresses, '-' writes to stdout)")
+    
+    imports = commands.add_parser('import', help="import expenses from CSV")
+    imports.add_argument('file', help="file to read ('.gz' is decompressed, '-' reads stdin)")
+    
+    delete = commands.add_parser('delete', help="delete expenses by id (see 'list')")
+    delete.add_argument('ids', nargs='+', type=parse_id, metavar='ID')
+    
+    delete_where = commands.add_parser('delete-where', help="delete every expense matching the filters")
+    add_filter_arguments(delete_where)
+    
+    update = commands.add_parser('update', help="change fields of one expense")
+    update.add_argument('id', type=parse_id)
+    update.add_argument('--amount', type=float, help="new amount")
+    update.add_argument('--description', help="new description")
+    update.add_argument('--category', help="new category")
+    update.add_argument('--date', help="new date (YYYY-MM-DD)")
+    
+    commands.add_parser('batch', help="apply JSON-lines add/update/delete operations from stdin in one transaction")
+    
+    chart = commands.add_parser('chart', help="save a chart without opening a window")
+    chart.add_argument('kind', choices=CHART_KINDS)
+    chart.add_argument('--format', choices=CHART_FORMATS, default='png', help="file format (default: png)")
+    
+    commands.add_parser('check', help="verify the report totals against the raw expenses and rebuild them if needed")
+    return parser
+
+def run_command(tracker, args):
+    """Run one command-line command; returns the process exit code"""
+    if args.command == 'add':
+        expense = parse_row({'date': args.date, 'description': args.description,
+                             'category': args.category, 'amount': args.amount})
+        if expense is None:
+            print("✗ Need a YYYY-MM-DD date and a positive amount.")
+            return 1
+        expense_id = tracker.storage.add(expense)
+        print(f"✓ Expense {expense_id} added (${expense['amount']:.2f} for {expense['category']})")
+    
+    elif args.command == 'list':
+        filters = get_filters(args)
+        if args.json:
+            for expense in tracker.storage.search(descending=True, limit=args.limit, **filters):
+                print(json.dumps(expense))
+        else:
+            tracker.print_search_results(filters, max_rows=args.limit, show_ids=True)
+    
+    elif args.command == 'summary':
+        if not tracker.print_summary(None if args.month == 'all' else args.month):
+            return 1
+    
+    elif args.command == 'export':
+        rows, seconds = export_csv(tracker.storage, args.file)
+        # Keep stdout clean when the CSV itself goes there
+        out = sys.stderr if args.file == '-' else sys.stdout
+        print(f"✓ {rows} expenses exported to: {args.file} ({rate(rows, seconds)})", file=out)
+    
+    elif args.command == 'import':
+        imported, skipped, seconds = import_csv(tracker.storage, args.file)
+        print(f"✓ Imported {imported} expenses ({rate(imported, seconds)}), skipped {skipped} invalid row(s)")
+    
+    elif args.command == 'delete':
+        with tracker.storage.transaction():
+            deleted = [expense_id for expense_id in args.ids if tracker.storage.delete(expense_id)]
+        print(f"✓ Deleted {len(deleted)} expense(s)")
+        if len(deleted) < len(args.ids):
+            print(f"✗ Not found: {', '.join(str(i) for i in args.ids if i not in deleted)}")
+            return 1
+    
+    elif args.command == 'delete-where':
+        filters = get_filters(args)
+        if not filters:
+            print("✗ Give at least one filter (use 'delete-where --from 1900-01-01' to really delete everything).")
+            return 1
+        try:
+            deleted = tracker.storage.delete_where(**filters)
+        except re.error as e:
+            print(f"✗ Invalid regular expression: {e}")
+            return 1
+        print(f"✓ Deleted {deleted} matching expense(s)")
+    
+    elif args.command == 'update':
+        changes = {key: getattr(args, key) for key in ('amount', 'description', 'category', 'date')
+                   if getattr(args, key) is not None}
+        if not changes:
+            print("✗ Nothing to change (use --amount, --description, --category or --date).")
+            return 1
+        error = tracker.update_expense(args.id, changes)
+        if error:
+            print(f"✗ {error}")
+            return 1
+        print(f"✓ Expense {args.id} updated")
+    
+    elif args.command == 'batch':
+        start = time.perf_counter()
+        try:
+            added, updated, deleted, missing = tracker.run_batch(sys.stdin)
+        except ValueError as e:
+            print(f"✗ Batch cancelled, nothing was changed: {e}")
+            return 1
+        seconds = time.perf_counter() - start
+        print(f"✓ Batch committed: {added} added, {updated} updated, {deleted} deleted "
+              f"({rate(added + updated + deleted, seconds)})")
+        if missing:
+            print(f"  {missing} update(s)/delete(s) referred to unknown ids")
+    
+    elif args.command == 'chart':
+        if tracker.save_chart(args.kind, args.format) is None:
+            return 1
+    
+    elif args.command == 'check':
+        tracker.check_rollups()
+    
+    return 0
+
 if __name__ == "__main__":
-    tracker = ExpenseTracker()
+    args = build_parser().parse_args()
+    tracker = ExpenseTracker(args.storage)
+    if args.command:
+        try:
+            status = run_command(tracker, args)
+        except BrokenPipeError:
+            # Output piped into something like `head` that stopped reading
+            os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+            status = 1
+        finally:
+            tracker.storage.close()
+        sys.exit(status)
     tracker.run()
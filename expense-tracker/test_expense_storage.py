@@ -0,0 +1,74 @@
+"""
+Tests for the storage backends' multi-filter search
+Run with: python -m pytest test_expense_storage.py (or python -m unittest)
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from expense_storage import JSONStorage, SQLiteStorage, LedgerStorage
+
+EXPENSES = [
+    {'date': '2025-10-01', 'description': 'Groceries', 'category': 'Food & Dining', 'amount': 40.0},
+    {'date': '2025-10-02', 'description': 'Bus', 'category': 'Transportation', 'amount': 2.5},
+    {'date': '2025-10-03', 'description': 'Lunch', 'category': 'Food & Dining', 'amount': 12.0},
+    {'date': '2025-10-04', 'description': 'Taxi', 'category': 'Transportation', 'amount': 18.0},
+    {'date': '2025-10-05', 'description': 'Dinner', 'category': 'Food & Dining', 'amount': 30.0},
+    {'date': '2025-10-06', 'description': 'Train', 'category': 'Transportation', 'amount': 9.0},
+    {'date': '2025-10-07', 'description': 'Cinema', 'category': 'Entertainment', 'amount': 11.0},
+]
+
+class SearchTest(unittest.TestCase):
+    """search() and delete_where() behave the same on every backend"""
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.storages = {
+            'json': JSONStorage(os.path.join(self.directory, "expenses.json")),
+            'sqlite': SQLiteStorage(os.path.join(self.directory, "expenses.db"), legacy_json=None),
+            'ledger': LedgerStorage(os.path.join(self.directory, "expenses.jsonl"), legacy_json=None)
+        }
+        for storage in self.storages.values():
+            storage.add_many([dict(expense) for expense in EXPENSES])
+    
+    def tearDown(self):
+        for storage in self.storages.values():
+            storage.close()
+        shutil.rmtree(self.directory)
+    
+    def descriptions(self, expenses):
+        return [expense['description'] for expense in expenses]
+    
+    def test_several_categories(self):
+        for name, storage in self.storages.items():
+            with self.subTest(backend=name):
+                found = storage.search(categories=['Food & Dining', 'Transportation'])
+                self.assertEqual(self.descriptions(found),
+                                 ['Groceries', 'Bus', 'Lunch', 'Taxi', 'Dinner', 'Train'])
+    
+    def test_several_categories_descending_with_dates(self):
+        for name, storage in self.storages.items():
+            with self.subTest(backend=name):
+                found = storage.search(start_date='2025-10-02', end_date='2025-10-05',
+                                       categories=['Transportation', 'Food & Dining'], descending=True)
+                self.assertEqual(self.descriptions(found), ['Dinner', 'Taxi', 'Lunch', 'Bus'])
+    
+    def test_several_categories_unequal_lengths(self):
+        for name, storage in self.storages.items():
+            with self.subTest(backend=name):
+                found = storage.search(categories=['Entertainment', 'Transportation'], limit=3)
+                self.assertEqual(self.descriptions(found), ['Bus', 'Taxi', 'Train'])
+                found = storage.search(categories=['Entertainment', 'Food & Dining', 'Missing'])
+                self.assertEqual(self.descriptions(found), ['Groceries', 'Lunch', 'Dinner', 'Cinema'])
+    
+    def test_delete_where_several_categories(self):
+        for name, storage in self.storages.items():
+            with self.subTest(backend=name):
+                deleted = storage.delete_where(categories=['Food & Dining', 'Entertainment'])
+                self.assertEqual(deleted, 4)
+                self.assertEqual(self.descriptions(storage.search()), ['Bus', 'Taxi', 'Train'])
+
+if __name__ == "__main__":
+    unittest.main()
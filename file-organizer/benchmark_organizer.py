@@ -0,0 +1,272 @@
+"""
+File Organizer Benchmark - Measure how the organizer scales
+Features:
+- Builds synthetic directory trees (on tmpfs when available)
+- Varies file count, folder depth, name collision rate and extension mix
+- Times organize, statistics, undo and clean empty folders
+- Reports files/sec, peak RSS and (with strace) syscall counts
+- Saves results as JSON so runs can be compared across changes
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import resource
+import subprocess
+import tempfile
+from datetime import datetime
+
+# Extension mixes: extension -> relative weight ('' means no extension)
+EXTENSION_MIXES = {
+    'default': {'.jpg': 4, '.png': 2, '.pdf': 3, '.docx': 1, '.mp3': 2, '.mp4': 1,
+                '.zip': 1, '.py': 1, '.csv': 1, '.json': 1, '.xyz': 1, '': 1},
+    'media': {'.jpg': 6, '.png': 3, '.mp4': 3, '.mkv': 1, '.mp3': 3, '.flac': 1},
+    'unknown': {'.xyz': 3, '.dat': 2, '.bin': 2, '': 3},
+}
+
+# Operations in the order they are run against each tree
+OPERATIONS = ['statistics_cold', 'statistics_warm', 'organize', 'undo', 'clean']
+
+def parse_mix(value):
+    """Accept a named mix or 'jpg:5,pdf:2,none:1'"""
+    if value in EXTENSION_MIXES:
+        return EXTENSION_MIXES[value]
+    
+    mix = {}
+    for part in value.split(','):
+        ext, _, weight = part.partition(':')
+        ext = '' if ext in ('', 'none') else '.' + ext.lstrip('.')
+        mix[ext] = int(weight or 1)
+    return mix
+
+def default_root():
+    """Prefer a RAM-backed tmpfs so disk speed does not dominate"""
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+def build_tree(target, file_count, depth, collision_rate, mix, seed=42):
+    """Create file_count small files spread over `depth` levels of folders"""
+    rng = random.Random(seed)
+    extensions = list(mix.keys())
+    weights = list(mix.values())
+    
+    # Folders at each level; level 0 is the target itself
+    folders = [target]
+    for level in range(1, depth + 1):
+        for index in range(4):
+            folder = os.path.join(folders[-1] if level > 1 else target, f"level{level}_{index}")
+            os.makedirs(folder, exist_ok=True)
+            folders.append(folder)
+    
+    used_names = []
+    for index in range(file_count):
+        ext = rng.choices(extensions, weights)[0]
+        
+        # A colliding file reuses an earlier name (same category, different folder)
+        if used_names and rng.random() < collision_rate:
+            name = rng.choice(used_names)
+            folder = rng.choice([f for f in folders if not os.path.exists(os.path.join(f, name))] or folders)
+            if os.path.exists(os.path.join(folder, name)):
+                name = f"file_{index}{ext}"
+        else:
+            name = f"file_{index}{ext}"
+            folder = rng.choice(folders)
+            if len(used_names) < 10000:
+                used_names.append(name)
+        
+        with open(os.path.join(folder, name), 'wb') as f:
+            f.write(b'x' * rng.randint(0, 256))
+    
+    return target
+
+def peak_rss_kb():
+    """Peak resident set size of this process in KiB"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux kilobytes
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+def run_child(operation, target, workdir, recursive, sniff=True):
+    """Run one operation in this (child) process and print its measurements as JSON"""
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from file_organizer import FileOrganizer
+    import logging
+    
+    os.chdir(workdir)
+    organizer = FileOrganizer(target)
+    organizer.configure_logging(level=logging.WARNING, quiet=True)
+    if not sniff:
+        # Extension lookup only, to measure what content sniffing costs
+        organizer.resolvers = [organizer.resolve_by_extension]
+    
+    # Time spent reading file headers, measured inside the same run so that
+    # machine noise between runs does not hide it
+    sniff_seconds = [0.0]
+    sniff_file = organizer.sniff_file
+    def timed_sniff(file_path):
+        start = time.perf_counter()
+        try:
+            return sniff_file(file_path)
+        finally:
+            sniff_seconds[0] += time.perf_counter() - start
+    organizer.sniff_file = timed_sniff
+    
+    start = time.perf_counter()
+    if operation.startswith('statistics'):
+        organizer.show_statistics()
+    elif operation == 'organize':
+        organizer.organize_files(recursive=recursive)
+    elif operation == 'undo':
+        organizer.undo_last_organization()
+    elif operation == 'clean':
+        organizer.clean_empty_folders()
+    elapsed = time.perf_counter() - start
+    
+    print(json.dumps({'elapsed': elapsed, 'peak_rss_kb': peak_rss_kb(), 'sniff_seconds': sniff_seconds[0]}))
+
+def parse_strace_summary(path):
+    """Total syscall count from an `strace -c` summary"""
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                parts = line.split()
+                if parts and parts[-1] == 'total':
+                    # columns: % time, seconds, usecs/call, calls, [errors], total
+                    numbers = [p for p in parts[:-1] if p.replace('.', '', 1).isdigit()]
+                    return int(numbers[3]) if len(numbers) >= 4 else None
+    except OSError:
+        pass
+    return None
+
+def measure(operation, target, workdir, recursive, use_strace, sniff=True):
+    """Run an operation in a fresh process (optionally under strace) and collect metrics"""
+    command = [sys.executable, os.path.abspath(__file__), '--child', operation, target, workdir]
+    if recursive:
+        command.append('--recursive')
+    if not sniff:
+        command.append('--no-sniff')
+    
+    strace_file = None
+    if use_strace:
+        strace_file = os.path.join(workdir, f"strace_{operation}.txt")
+        command = ['strace', '-f', '-c', '-o', strace_file] + command
+    
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"{operation} failed:\n{result.stderr}")
+    
+    metrics = json.loads(result.stdout.strip().splitlines()[-1])
+    metrics['syscalls'] = parse_strace_summary(strace_file) if strace_file else None
+    return metrics
+
+def git_commit():
+    """Current commit hash, if the benchmark runs inside a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+def run_benchmarks(args):
+    """Build a tree per file count and time every operation against it"""
+    mix = parse_mix(args.mix)
+    use_strace = args.strace and shutil.which('strace') is not None
+    if args.strace and not use_strace:
+        print("Note: strace not found, syscall counts will be skipped.")
+    
+    results = {
+        'timestamp': datetime.now().isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'root': args.root,
+        'depth': args.depth,
+        'collision_rate': args.collision_rate,
+        'mix': args.mix,
+        'sniff': not args.no_sniff,
+        'runs': []
+    }
+    
+    print("="*86)
+    print(f"{'Files':>9} {'Operation':<16} {'Seconds':>9} {'Files/sec':>12} {'Peak RSS':>12} {'Syscalls':>12} {'Sniff':>7}")
+    print("-"*86)
+    
+    for file_count in args.counts:
+        base = tempfile.mkdtemp(prefix='organizer_bench_', dir=args.root)
+        target = os.path.join(base, 'target')
+        workdir = os.path.join(base, 'work')
+        os.makedirs(target)
+        os.makedirs(workdir)
+        
+        try:
+            start = time.perf_counter()
+            build_tree(target, file_count, args.depth, args.collision_rate, mix)
+            build_seconds = time.perf_counter() - start
+            
+            for operation in OPERATIONS:
+                metrics = measure(operation, target, workdir, args.depth > 0, use_strace, not args.no_sniff)
+                metrics.update({
+                    'files': file_count,
+                    'operation': operation,
+                    'files_per_sec': file_count / metrics['elapsed'] if metrics['elapsed'] else None,
+                    'build_seconds': build_seconds
+                })
+                results['runs'].append(metrics)
+                
+                syscalls = metrics['syscalls'] if metrics['syscalls'] is not None else '-'
+                sniff_share = metrics['sniff_seconds'] / metrics['elapsed'] if metrics['elapsed'] else 0.0
+                print(f"{file_count:>9} {operation:<16} {metrics['elapsed']:>9.3f} "
+                      f"{metrics['files_per_sec']:>12,.0f} {metrics['peak_rss_kb']:>9,} KB {syscalls:>12} "
+                      f"{sniff_share:>7.1%}")
+        finally:
+            if not args.keep:
+                shutil.rmtree(base, ignore_errors=True)
+    
+    print("="*86)
+    
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"✓ Results saved to: {args.output}")
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Benchmark the file organizer on synthetic trees")
+    parser.add_argument('--counts', default='1000,10000,100000',
+                        type=lambda value: [int(v) for v in value.split(',')],
+                        help="comma separated file counts (default: 1000,10000,100000; up to 1000000)")
+    parser.add_argument('--depth', type=int, default=0,
+                        help="levels of nested folders (0 = all files at the top level)")
+    parser.add_argument('--collision-rate', type=float, default=0.1,
+                        help="fraction of files that reuse an earlier file name (default: 0.1)")
+    parser.add_argument('--mix', default='default',
+                        help=f"extension mix: {', '.join(EXTENSION_MIXES)} or e.g. 'jpg:5,pdf:2,none:1'")
+    parser.add_argument('--root', default=default_root(),
+                        help="where to build the trees (default: /dev/shm when available)")
+    parser.add_argument('--strace', action='store_true', help="count syscalls with strace -c")
+    parser.add_argument('--no-sniff', action='store_true',
+                        help="categorize by extension only (baseline for the content sniffing cost)")
+    parser.add_argument('--keep', action='store_true', help="keep the generated trees")
+    parser.add_argument('--output',
+                        default=f"benchmark_results/organizer_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                        help="where to write the JSON results")
+    parser.add_argument('--child', nargs=3, metavar=('OPERATION', 'TARGET', 'WORKDIR'),
+                        help=argparse.SUPPRESS)
+    parser.add_argument('--recursive', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+def main():
+    """Main program"""
+    args = parse_args()
+    if args.child:
+        run_child(*args.child, recursive=args.recursive, sniff=not args.no_sniff)
+    else:
+        run_benchmarks(args)
+
+if __name__ == "__main__":
+    main()
@@ -2,22 +2,966 @@
 File Organizer - Auto-organize downloads folder
 Features:
 - Organize files by extension into categorized folders
+- Detect misnamed or extensionless files from their content (magic bytes)
 - Move files to appropriate folders (Documents, Images, Videos, etc.)
-- Undo last organization
+- Undo any of the last organizations (crash-safe journal)
 - Dry run mode (preview changes)
-- Custom folder mappings
-- Schedule automatic organization
-- Detailed logging
+- Custom folder mappings (TOML/YAML rules file)
+- Schedule automatic organization (watch mode)
+- Detailed logging (leveled, buffered, rotated, optional JSON lines)
 """
 
 import os
+import sys
+import time
+import stat
+import errno
 import shutil
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+import hashlib
+import heapq
+import mmap
 from pathlib import Path
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from collections import OrderedDict
 import json
+import sqlite3
+import argparse
+import logging
+import atexit
+import re
+import fnmatch
+import string
+import mimetypes
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# Log level for the lines that make up a run summary (shown even in quiet mode)
+SUMMARY = 25
+logging.addLevelName(SUMMARY, 'SUMMARY')
+
+class RotatingLogFile:
+    """Size-rotated log file kept open with a large write buffer"""
+    
+    def __init__(self, filename, max_bytes=5 * 1024 * 1024, backup_count=3, buffer_size=64 * 1024):
+        self.filename = os.path.abspath(filename)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffer_size = buffer_size
+        self.stream = None
+        self.size = 0
+    
+    def open_stream(self):
+        """Open the log file in append mode and pick up its current size"""
+        self.stream = open(self.filename, 'ab', buffering=self.buffer_size)
+        self.size = self.stream.tell()
+    
+    def rotate(self):
+        """Shift file.log -> file.log.1 -> ... and start a fresh file"""
+        self.stream.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            older = f"{self.filename}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.filename}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.filename, f"{self.filename}.1")
+        else:
+            os.remove(self.filename)
+        self.open_stream()
+    
+    def write(self, line):
+        """Append one line; the size is tracked here because asking the file would flush it"""
+        data = (line + '\n').encode('utf-8')
+        if self.stream is None:
+            self.open_stream()
+        if self.max_bytes and self.size and self.size + len(data) > self.max_bytes:
+            self.rotate()
+        self.stream.write(data)
+        self.size += len(data)
+    
+    def flush(self):
+        """Push buffered lines to the OS"""
+        if self.stream is not None:
+            self.stream.flush()
+    
+    def close(self):
+        """Flush and close the file"""
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+class OrganizerLogger:
+    """Leveled logger writing to a buffered rotating file and the console"""
+    
+    def __init__(self, log_file, level=logging.INFO, quiet=False, json_lines=False,
+                 max_bytes=5 * 1024 * 1024, backup_count=3):
+        self.file = RotatingLogFile(log_file, max_bytes, backup_count)
+        self.file_level = level
+        self.console_level = SUMMARY if quiet else level
+        self.min_level = min(self.file_level, self.console_level)
+        self.json_lines = json_lines
+        self.lock = threading.Lock()
+        self.stamp_second = None
+        self.stamp = ""
+        atexit.register(self.close)
+    
+    def timestamp(self):
+        """Current time as text, formatted at most once per second"""
+        second = int(time.time())
+        if second != self.stamp_second:
+            self.stamp_second = second
+            self.stamp = datetime.fromtimestamp(second).strftime("%Y-%m-%d %H:%M:%S")
+        return self.stamp
+    
+    def log(self, level, message):
+        """Write a message to every output whose level allows it (thread-safe)"""
+        if level < self.min_level:
+            return
+        
+        with self.lock:
+            stamp = self.timestamp()
+            text_line = f"[{stamp}] {message}"
+            
+            if level >= self.console_level:
+                sys.stdout.write(text_line + '\n')
+            
+            if level >= self.file_level:
+                if self.json_lines:
+                    self.file.write(json.dumps({
+                        'time': stamp,
+                        'level': logging.getLevelName(level),
+                        'message': message
+                    }, ensure_ascii=False))
+                else:
+                    self.file.write(text_line)
+            
+            # Summaries, warnings and errors reach the disk right away
+            if level >= SUMMARY:
+                self.file.flush()
+    
+    def close(self):
+        """Flush and close the log file"""
+        with self.lock:
+            self.file.close()
+
+def read_rules_file(rules_file):
+    """Parse a rules file: TOML (built in) or YAML (needs PyYAML)"""
+    if rules_file.lower().endswith(('.yaml', '.yml')):
+        if yaml is None:
+            raise ValueError("PyYAML is not installed (pip install pyyaml)")
+        with open(rules_file, 'r', encoding='utf-8') as f:
+            return yaml.safe_load(f) or {}
+    
+    if tomllib is None:
+        raise ValueError("TOML rules need Python 3.11+ (or use a .yaml file)")
+    with open(rules_file, 'rb') as f:
+        return tomllib.load(f)
+
+def parse_size(value):
+    """Turn 1024, '10KB' or '1.5 GB' into a number of bytes"""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMGT]?)i?B?\s*', str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"invalid size: {value!r}")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** ' KMGT'.index(unit.upper()))
+
+# A numbered backreference (\1) or group conditional ((?(1)...)) in a user regex
+NUMBERED_REFERENCE = re.compile(r'(?<!\\)(?:\\\\)*\\[1-9]|\(\?\(\d')
+
+# Global inline flags such as (?i) at the start of a user regex
+LEADING_FLAGS = re.compile(r'\(\?([aiLmsux]+)\)')
+
+def scoped_pattern(regex):
+    """Wrap a user regex in a group, turning leading global flags like (?i) into scoped ones
+    
+    Global flags are only allowed at the very start of a pattern, so they
+    have to become (?i:...) once the regex is embedded in a larger one.
+    """
+    flags = ''
+    found = LEADING_FLAGS.match(regex)
+    while found:
+        flags += found.group(1)
+        regex = regex[found.end():]
+        found = LEADING_FLAGS.match(regex)
+    if not flags:
+        return f"(?:{regex})"
+    # A verbose-mode comment on the last line must not swallow the closing parenthesis
+    return f"(?{flags}:{regex}\n)" if 'x' in flags else f"(?{flags}:{regex})"
+
+class Rule:
+    """One compiled organization rule"""
+    
+    # Placeholders a destination template may use (filled in by destination_for)
+    PLACEHOLDERS = {'category', 'year', 'month', 'day', 'ext', 'name', 'rule'}
+    
+    def __init__(self, index, config):
+        self.index = index
+        self.name = config.get('name', f"rule {index + 1}")
+        self.extensions = {ext.lower() for ext in config.get('extensions', [])}
+        self.glob = config.get('glob')
+        self.regex = config.get('regex')
+        self.min_size = parse_size(config.get('min_size'))
+        self.max_size = parse_size(config.get('max_size'))
+        self.older_than = config.get('older_than_days')
+        self.newer_than = config.get('newer_than_days')
+        self.mime = config.get('mime')
+        self.category = config.get('category')
+        self.destination = config.get('destination', '{category}')
+        
+        # Catch template typos now rather than halfway through a run
+        for _, field, _, _ in string.Formatter().parse(self.destination):
+            if field is None:
+                continue
+            key = re.split(r'[.\[]', field, maxsplit=1)[0]
+            if key not in self.PLACEHOLDERS:
+                raise ValueError(f"{self.name}: unknown placeholder {{{field}}} in destination "
+                                 f"'{self.destination}'")
+        
+        # Compiled name pattern (glob and regex must both match when both are given)
+        parts = []
+        if self.glob:
+            parts.append(f"(?={fnmatch.translate(self.glob)})")
+        if self.regex:
+            re.compile(self.regex)
+            parts.append(f"(?=.*?{scoped_pattern(self.regex)})")
+        self.pattern_source = ''.join(parts)
+        self.pattern = re.compile(self.pattern_source, re.DOTALL) if parts else None
+    
+    def matches_name(self, name):
+        """Check the glob/regex part of the rule"""
+        return self.pattern is None or self.pattern.match(name) is not None
+    
+    def matches_rest(self, file_entry, organizer):
+        """Check the slower predicates: size, age and sniffed MIME type"""
+        if self.min_size is not None or self.max_size is not None or \
+                self.older_than is not None or self.newer_than is not None:
+            st = file_entry.stat()
+            if self.min_size is not None and st.st_size < self.min_size:
+                return False
+            if self.max_size is not None and st.st_size > self.max_size:
+                return False
+            
+            age_days = (time.time() - st.st_mtime) / 86400
+            if self.older_than is not None and age_days < self.older_than:
+                return False
+            if self.newer_than is not None and age_days > self.newer_than:
+                return False
+        
+        if self.mime is not None:
+            mime = organizer.get_mime_type(file_entry)
+            if mime is None or not fnmatch.fnmatch(mime, self.mime):
+                return False
+        return True
+    
+    def destination_for(self, file_entry, category):
+        """Fill in the destination template for a file"""
+        modified = datetime.fromtimestamp(file_entry.stat().st_mtime)
+        stem, ext = os.path.splitext(file_entry.name)
+        folder = self.destination.format_map({
+            'category': category,
+            'year': f"{modified.year:04d}",
+            'month': f"{modified.month:02d}",
+            'day': f"{modified.day:02d}",
+            'ext': ext.lstrip('.').lower() or 'none',
+            'name': stem,
+            'rule': self.name
+        })
+        # Never let a template escape the target directory
+        parts = [part for part in Path(folder).parts if part not in ('', '.', '..', os.sep)]
+        return os.path.join(*parts) if parts else category
+
+class RuleSet:
+    """Rules compiled into a decision structure instead of a linear scan
+    
+    1. exact extension -> rules hash lookup
+    2. one combined regex for every glob/regex rule
+    3. the remaining predicate-only rules (size, age, MIME)
+    
+    The stages only narrow down the candidates; the rule declared first still wins.
+    """
+    
+    def __init__(self, rule_configs):
+        self.rules = [Rule(index, config) for index, config in enumerate(rule_configs)]
+        
+        self.by_extension = {}
+        self.pattern_rules = []
+        self.other_rules = []
+        for rule in self.rules:
+            # A bare '*.ext' glob is just an extension test, so it can use the hash lookup
+            # ('*.tar.gz' is not: splitext only ever sees the last suffix)
+            if rule.glob and not rule.regex and not rule.extensions and \
+                    re.fullmatch(r'\*\.[^*?\[\].]+', rule.glob):
+                rule.extensions = {rule.glob[1:].lower()}
+                rule.glob = None
+                rule.pattern_source = ''
+                rule.pattern = None
+            
+            if rule.extensions:
+                for extension in rule.extensions:
+                    self.by_extension.setdefault(extension, []).append(rule)
+            elif rule.pattern is not None:
+                self.pattern_rules.append(rule)
+            else:
+                self.other_rules.append(rule)
+        
+        # Each alternative ends in an empty named group so lastgroup tells which rule matched
+        # Numbered group references would point into another rule's groups once the
+        # patterns are joined, so such rule sets are matched one rule at a time
+        self.combined = None
+        renumbered = any(rule.regex and NUMBERED_REFERENCE.search(rule.regex) for rule in self.pattern_rules)
+        if self.pattern_rules and not renumbered:
+            alternatives = [f"(?:{rule.pattern_source}(?P<r{position}>))"
+                            for position, rule in enumerate(self.pattern_rules)]
+            try:
+                self.combined = re.compile('|'.join(alternatives), re.DOTALL)
+            except re.error:
+                # e.g. clashing named groups in user regexes; test the rules one by one
+                self.combined = None
+        
+        # Literal top-level folders the rules sort into (skipped by recursive scans)
+        self.top_folders = set()
+        for rule in self.rules:
+            first = Path(rule.destination).parts[0] if rule.destination else ''
+            if first and '{' not in first:
+                self.top_folders.add(first)
+            if rule.category:
+                self.top_folders.add(rule.category)
+    
+    def match(self, file_entry, organizer):
+        """Return (category, relative folder) for the first declared matching rule, or None"""
+        name = file_entry.name
+        
+        # Each stage yields its name-matching rules in declaration order; merging them
+        # by index means the slower predicates are checked in the order rules were declared
+        candidates = heapq.merge(self.extension_candidates(name), self.pattern_candidates(name),
+                                 self.other_rules, key=lambda rule: rule.index)
+        for rule in candidates:
+            if rule.matches_rest(file_entry, organizer):
+                return self.resolve(rule, file_entry, organizer)
+        return None
+    
+    def extension_candidates(self, name):
+        """Stage 1: extension hash lookup"""
+        extension = os.path.splitext(name)[1].lower()
+        for rule in self.by_extension.get(extension, ()):
+            if rule.matches_name(name):
+                yield rule
+    
+    def pattern_candidates(self, name):
+        """Stage 2: a single combined regex skips to the first name-matching rule"""
+        if not self.pattern_rules:
+            return
+        start = 0
+        if self.combined is not None:
+            found = self.combined.match(name)
+            if found is None:
+                return
+            start = int(found.lastgroup[1:])
+        
+        for rule in self.pattern_rules[start:]:
+            if rule.matches_name(name):
+                yield rule
+    
+    def resolve(self, rule, file_entry, organizer):
+        """Work out the category and folder for a matched rule"""
+        category = rule.category or organizer.get_file_category(file_entry)
+        return category, rule.destination_for(file_entry, category)
+
+class DirectoryIndex:
+    """SQLite index of the files under a directory, refreshed incrementally by folder mtime"""
+    
+    def __init__(self, db_file):
+        self.conn = sqlite3.connect(db_file)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS dirs (
+                root TEXT, path TEXT, parent TEXT, mtime INTEGER,
+                PRIMARY KEY (root, path)
+            );
+            CREATE INDEX IF NOT EXISTS idx_dirs_parent ON dirs (root, parent);
+            CREATE TABLE IF NOT EXISTS files (
+                root TEXT, path TEXT, dir TEXT, mtime INTEGER, size INTEGER,
+                inode INTEGER, category TEXT,
+                PRIMARY KEY (root, path)
+            );
+            CREATE INDEX IF NOT EXISTS idx_files_dir ON files (root, dir);
+            CREATE INDEX IF NOT EXISTS idx_files_category ON files (root, category, size);
+        """)
+    
+    def refresh(self, root, categorize, skip, full=False):
+        """Bring the index up to date, only listing folders whose mtime changed"""
+        rescanned = 0
+        pending = [(root, None)]
+        
+        with self.conn:
+            while pending:
+                directory, parent = pending.pop()
+                try:
+                    # Stat before listing so changes made during the listing are seen next time
+                    mtime = os.stat(directory).st_mtime_ns
+                except OSError:
+                    self.forget_tree(root, directory)
+                    continue
+                
+                row = self.conn.execute(
+                    "SELECT mtime FROM dirs WHERE root = ? AND path = ?", (root, directory)
+                ).fetchone()
+                
+                if not full and row and row[0] == mtime:
+                    # Unchanged folder: reuse the indexed files, only descend into known subfolders
+                    children = self.conn.execute(
+                        "SELECT path FROM dirs WHERE root = ? AND parent = ?", (root, directory)
+                    ).fetchall()
+                    pending.extend((child, directory) for (child,) in children)
+                    continue
+                
+                files, subdirs = [], []
+                try:
+                    with os.scandir(directory) as entries:
+                        for entry in entries:
+                            if entry.is_file():
+                                if skip(entry.name):
+                                    continue
+                                stat = entry.stat()
+                                files.append((root, entry.path, directory, stat.st_mtime_ns,
+                                              stat.st_size, entry.inode(), categorize(entry)))
+                            elif entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.'):
+                                subdirs.append(entry.path)
+                except OSError:
+                    continue
+                
+                rescanned += 1
+                self.conn.execute("DELETE FROM files WHERE root = ? AND dir = ?", (root, directory))
+                self.conn.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)", files)
+                
+                # Drop folders that disappeared since the last scan
+                known = self.conn.execute(
+                    "SELECT path FROM dirs WHERE root = ? AND parent = ?", (root, directory)
+                ).fetchall()
+                for (child,) in known:
+                    if child not in subdirs:
+                        self.forget_tree(root, child)
+                
+                self.conn.execute("INSERT OR REPLACE INTO dirs VALUES (?, ?, ?, ?)",
+                                  (root, directory, parent, mtime))
+                pending.extend((child, directory) for child in subdirs)
+        
+        return rescanned
+    
+    def forget_tree(self, root, directory):
+        """Remove a folder and everything below it from the index"""
+        prefix = directory + os.sep
+        for table, column in (('files', 'dir'), ('dirs', 'path')):
+            self.conn.execute(
+                f"DELETE FROM {table} WHERE root = ? AND ({column} = ? OR substr({column}, 1, ?) = ?)",
+                (root, directory, len(prefix), prefix)
+            )
+    
+    def category_stats(self, root):
+        """Return {category: (count, total_size)} straight from the index"""
+        rows = self.conn.execute(
+            "SELECT category, COUNT(*), SUM(size) FROM files WHERE root = ? GROUP BY category",
+            (root,)
+        ).fetchall()
+        return {category: (count, size) for category, count, size in rows}
+    
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
+
+# Number of bytes read when sniffing file contents
+SNIFF_BYTES = 512
+
+# (offset, signature, mime type, category) checked against the start of a file
+MAGIC_NUMBERS = [
+    (0, b'\x89PNG\r\n\x1a\n', 'image/png', 'Images'),
+    (0, b'\xff\xd8\xff', 'image/jpeg', 'Images'),
+    (0, b'GIF87a', 'image/gif', 'Images'),
+    (0, b'GIF89a', 'image/gif', 'Images'),
+    (0, b'BM', 'image/bmp', 'Images'),
+    (0, b'II*\x00', 'image/tiff', 'Images'),
+    (0, b'MM\x00*', 'image/tiff', 'Images'),
+    (0, b'\x00\x00\x01\x00', 'image/x-icon', 'Images'),
+    (0, b'\x1aE\xdf\xa3', 'video/x-matroska', 'Videos'),
+    (0, b'FLV', 'video/x-flv', 'Videos'),
+    (0, b'ID3', 'audio/mpeg', 'Audio'),
+    (0, b'\xff\xfb', 'audio/mpeg', 'Audio'),
+    (0, b'fLaC', 'audio/flac', 'Audio'),
+    (0, b'OggS', 'audio/ogg', 'Audio'),
+    (0, b'%PDF-', 'application/pdf', 'Documents'),
+    (0, b'{\\rtf', 'application/rtf', 'Documents'),
+    (0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'application/x-ole-storage', 'Documents'),
+    (0, b'PK\x03\x04', 'application/zip', 'Archives'),
+    (0, b'Rar!\x1a\x07', 'application/vnd.rar', 'Archives'),
+    (0, b"7z\xbc\xaf'\x1c", 'application/x-7z-compressed', 'Archives'),
+    (0, b'\x1f\x8b', 'application/gzip', 'Archives'),
+    (0, b'BZh', 'application/x-bzip2', 'Archives'),
+    (257, b'ustar', 'application/x-tar', 'Archives'),
+    (0, b'\x7fELF', 'application/x-elf', 'Executables'),
+    (0, b'MZ', 'application/x-msdownload', 'Executables'),
+    (0, b'8BPS', 'image/vnd.adobe.photoshop', 'Design'),
+    (0, b'SQLite format 3\x00', 'application/vnd.sqlite3', 'Data'),
+    (0, b'<?xml', 'application/xml', 'Data'),
+    (0, b'#!', 'text/x-script', 'Code'),
+]
+
+# Offset-0 signatures grouped by their first byte, so a header is only compared
+# with the few signatures that can match; the rest are checked in full
+MAGIC_BY_FIRST_BYTE = {}
+MAGIC_ELSEWHERE = []
+for magic in MAGIC_NUMBERS:
+    if magic[0] == 0:
+        MAGIC_BY_FIRST_BYTE.setdefault(magic[1][:1], []).append(magic)
+    else:
+        MAGIC_ELSEWHERE.append(magic)
+
+# RIFF containers carry their real type at offset 8
+RIFF_TYPES = {
+    b'WAVE': ('audio/wav', 'Audio'),
+    b'AVI ': ('video/x-msvideo', 'Videos'),
+    b'WEBP': ('image/webp', 'Images'),
+}
+
+def sniff_magic(header):
+    """Identify a file from its first bytes, returning (mime, category) or None"""
+    if header[:4] == b'RIFF':
+        return RIFF_TYPES.get(header[8:12])
+    
+    # ISO base media files (mp4, m4a, mov) have 'ftyp' at offset 4 followed by the brand
+    if header[4:8] == b'ftyp':
+        brand = header[8:12]
+        if brand.startswith(b'M4A'):
+            return ('audio/mp4', 'Audio')
+        if brand == b'qt  ':
+            return ('video/quicktime', 'Videos')
+        return ('video/mp4', 'Videos')
+    
+    for candidates in (MAGIC_BY_FIRST_BYTE.get(header[:1], ()), MAGIC_ELSEWHERE):
+        for offset, signature, mime, category in candidates:
+            if header.startswith(signature, offset):
+                return (mime, category)
+    return None
+
+class LRUCache:
+    """Small least-recently-used cache built on an OrderedDict"""
+    
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+    
+    def __contains__(self, key):
+        return key in self.items
+    
+    def get(self, key, default=None):
+        """Return a cached value and mark it as recently used"""
+        if key not in self.items:
+            return default
+        self.items.move_to_end(key)
+        return self.items[key]
+    
+    def put(self, key, value):
+        """Store a value, evicting the least recently used one when full"""
+        self.items[key] = value
+        self.items.move_to_end(key)
+        if len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+
+class InotifyWatcher:
+    """Report names created or written in a directory using Linux inotify"""
+    
+    IN_MODIFY = 0x002
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_Q_OVERFLOW = 0x4000
+    EVENT_HEADER = struct.Struct('iIII')
+    
+    name = "inotify"
+    
+    def __init__(self, directory):
+        self.directory = directory
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(directory)), mask) < 0:
+            errno_value = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno_value, "inotify_add_watch failed")
+    
+    def read_events(self, timeout):
+        """Wait up to timeout seconds and return the file names that changed"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+        
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        
+        names = set()
+        overflowed = False
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if mask & self.IN_Q_OVERFLOW:
+                overflowed = True
+            elif name:
+                names.add(os.fsdecode(name))
+        
+        # The kernel dropped events, so any file may have landed unseen: report them all once
+        if overflowed:
+            names |= self.list_files()
+        return names
+    
+    def list_files(self):
+        """Names of every top-level file (a one-off rescan after a queue overflow)"""
+        try:
+            with os.scandir(self.directory) as entries:
+                return {entry.name for entry in entries if entry.is_file()}
+        except OSError:
+            return set()
+    
+    def close(self):
+        """Release the inotify file descriptor"""
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Portable fallback that compares top-level directory snapshots"""
+    
+    name = "polling"
+    
+    def __init__(self, directory):
+        self.directory = directory
+        self.snapshot = self.take_snapshot()
+    
+    def take_snapshot(self):
+        """Map file name -> (size, mtime) for the top-level files"""
+        snapshot = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    st = entry.stat()
+                    snapshot[entry.name] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+    
+    def read_events(self, timeout):
+        """Sleep for timeout seconds and return the file names that changed"""
+        time.sleep(timeout)
+        snapshot = self.take_snapshot()
+        changed = {name for name, info in snapshot.items() if self.snapshot.get(name) != info}
+        self.snapshot = snapshot
+        return changed
+    
+    def close(self):
+        """Nothing to release for the polling watcher"""
+        pass
+
+class DuplicateFinder:
+    """Find planned moves whose content already exists in their destination folder"""
+    
+    PARTIAL_BYTES = 64 * 1024
+    KNOWN_FOLDERS = 64
+    HASH_CACHE_SIZE = 100000
+    
+    def __init__(self, organizer, mode, executor):
+        self.organizer = organizer
+        self.mode = mode
+        self.executor = executor
+        # destination folder -> {size: [paths already in that folder]}, for the most recent folders
+        self.known = LRUCache(maxsize=self.KNOWN_FOLDERS)
+        # Digests are cheap to recompute, so only a bounded number are kept
+        self.partial_hashes = LRUCache(maxsize=self.HASH_CACHE_SIZE)
+        self.full_hashes = LRUCache(maxsize=self.HASH_CACHE_SIZE)
+        self.quarantine_names = None
+    
+    def known_sizes(self, folder):
+        """Index the files already in a destination folder by size (one listing per run)"""
+        sizes = self.known.get(folder)
+        if sizes is None:
+            sizes = {}
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            sizes.setdefault(entry.stat().st_size, []).append(entry.path)
+            except FileNotFoundError:
+                pass
+            self.known.put(folder, sizes)
+        return sizes
+    
+    def partial_hash(self, path):
+        """Hash the first and last 64 KiB of a file"""
+        with open(path, 'rb') as f:
+            digest = hashlib.blake2b(f.read(self.PARTIAL_BYTES))
+            f.seek(0, os.SEEK_END)
+            if f.tell() > 2 * self.PARTIAL_BYTES:
+                f.seek(-self.PARTIAL_BYTES, os.SEEK_END)
+                digest.update(f.read(self.PARTIAL_BYTES))
+        return digest.hexdigest()
+    
+    def full_hash(self, path):
+        """Hash a whole file through a memory map"""
+        with open(path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return hashlib.blake2b(mapped).hexdigest()
+    
+    def hash_all(self, paths, hash_func, cache):
+        """Hash paths in the worker pool, reusing cached digests"""
+        digests = {path: cache.get(path) for path in paths if path in cache}
+        missing = [path for path in paths if path not in digests]
+        for path, digest in zip(missing, self.executor.map(self.safe_hash(hash_func), missing)):
+            cache.put(path, digest)
+            digests[path] = digest
+        return digests
+    
+    def safe_hash(self, hash_func):
+        """Wrap a hash function so unreadable files never match anything"""
+        def wrapped(path):
+            try:
+                return hash_func(path)
+            except (OSError, ValueError):
+                return None
+        return wrapped
+    
+    def group_by(self, paths, digests):
+        """Group paths that share a (non-empty) digest"""
+        groups = {}
+        for path in paths:
+            if digests[path] is not None:
+                groups.setdefault(digests[path], []).append(path)
+        return [group for group in groups.values() if len(group) > 1]
+    
+    def mark_duplicates(self, batch):
+        """Set 'duplicate_of' on every planned move that is a confirmed duplicate"""
+        # Stage 1: group by (folder, size); a unique size can never be a duplicate
+        by_size = {}
+        moves_by_path = {}
+        for move in batch:
+            size = move['source'].stat().st_size
+            if size == 0:
+                continue
+            path = os.fspath(move['source'])
+            moves_by_path[path] = move
+            by_size.setdefault((move['dest'].parent, size), []).append(path)
+        
+        candidates = []
+        for (folder, size), paths in by_size.items():
+            group = self.known_sizes(folder).get(size, []) + paths
+            if len(group) > 1:
+                candidates.append(group)
+        
+        # Stage 2: partial hash of the first and last 64 KiB
+        partial_groups = []
+        for group in candidates:
+            digests = self.hash_all(group, self.partial_hash, self.partial_hashes)
+            partial_groups.extend(self.group_by(group, digests))
+        
+        # Stage 3: full hash only for files that still look identical
+        for group in partial_groups:
+            digests = self.hash_all(group, self.full_hash, self.full_hashes)
+            for same in self.group_by(group, digests):
+                # Keep the copy already in the category folder, or else the first new one
+                keeper = same[0]
+                if keeper in moves_by_path:
+                    keeper_dest = str(moves_by_path[keeper]['dest'])
+                else:
+                    keeper_dest = keeper
+                for path in same[1:]:
+                    if path in moves_by_path:
+                        moves_by_path[path]['duplicate_of'] = keeper_dest
+                        if self.mode == 'hardlink':
+                            moves_by_path[path]['link_to'] = keeper_dest
+        
+        if self.mode == 'quarantine':
+            self.redirect_to_quarantine(batch)
+        return batch
+    
+    def redirect_to_quarantine(self, batch):
+        """Send duplicates to the quarantine folder instead of their category"""
+        folder = self.organizer.target_dir / self.organizer.quarantine_folder
+        # Listed once per batch, so earlier batches' moves are seen without keeping every name
+        self.quarantine_names = None
+        
+        for move in batch:
+            if move.get('duplicate_of') is not None:
+                if self.quarantine_names is None:
+                    self.quarantine_names = self.organizer.list_folder_names(folder)
+                name = self.organizer.unique_name(move['source'].name, self.quarantine_names)
+                self.quarantine_names.add(name)
+                move['dest'] = folder / name
+    
+    def remember(self, moves):
+        """Make files moved in this batch visible to later batches"""
+        for move in moves:
+            dest = Path(move['source'])
+            sizes = self.known.get(dest.parent)
+            if sizes is not None:
+                try:
+                    size = dest.stat().st_size
+                except OSError:
+                    continue
+                sizes.setdefault(size, []).append(str(dest))
+                # Carry over digests computed under the old name (the old key just ages out)
+                for cache in (self.partial_hashes, self.full_hashes):
+                    if move['original'] in cache:
+                        cache.put(str(dest), cache.get(move['original']))
+
+class OrganizationJournal:
+    """Append-only JSON-lines journal of organization runs, fsynced in batches"""
+    
+    def __init__(self, path, sync_every=256):
+        self.path = path
+        self.sync_every = sync_every
+        self.lock = threading.Lock()
+        self.handle = None
+        self.unsynced = 0
+    
+    def append(self, record, sync=False):
+        """Write one record; fsync every sync_every records (or now if sync=True)"""
+        line = json.dumps(record, separators=(',', ':')) + '\n'
+        with self.lock:
+            if self.handle is None:
+                self.handle = open(self.path, 'a', encoding='utf-8')
+            self.handle.write(line)
+            self.unsynced += 1
+            if sync or self.unsynced >= self.sync_every:
+                self.handle.flush()
+                os.fsync(self.handle.fileno())
+                self.unsynced = 0
+    
+    def begin_run(self, target, options, timestamp=None):
+        """Start a new run and return its id"""
+        run_id = datetime.now().strftime('%Y%m%d%H%M%S%f')
+        self.append({
+            'type': 'begin',
+            'run': run_id,
+            'timestamp': timestamp or datetime.now().isoformat(),
+            'target': target,
+            'options': options
+        }, sync=True)
+        return run_id
+    
+    def record_move(self, run_id, move):
+        """Journal a completed move (safe to call from worker threads)"""
+        record = {'type': 'move', 'run': run_id, 'source': move['source'], 'original': move['original']}
+        if move.get('linked'):
+            record['linked'] = True
+        self.append(record)
+    
+    def record_folder(self, run_id, path):
+        """Journal a folder the organizer created, so cleanup never touches user folders"""
+        self.append({'type': 'folder', 'run': run_id, 'path': path})
+    
+    def end_run(self, run_id, moved):
+        """Mark a run as complete"""
+        self.append({'type': 'end', 'run': run_id, 'moves': moved}, sync=True)
+    
+    def mark_undone(self, run_id):
+        """Mark a run as undone"""
+        self.append({'type': 'undo', 'run': run_id}, sync=True)
+    
+    def lines(self):
+        """Stream the journal lines (flushing pending writes first)"""
+        with self.lock:
+            if self.handle is not None:
+                self.handle.flush()
+        
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                yield line
+    
+    def runs(self):
+        """Summaries of every run, oldest first (move records are counted, not parsed)"""
+        runs = {}
+        for line in self.lines():
+            if line.startswith('{"type":"move"'):
+                run_id = line[len('{"type":"move","run":"'):].split('"', 1)[0]
+                if run_id in runs:
+                    runs[run_id]['moves'] += 1
+                continue
+            
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn last line from a crash; everything before it is intact
+                continue
+            
+            if record['type'] == 'begin':
+                runs[record['run']] = {
+                    'run': record['run'],
+                    'timestamp': record['timestamp'],
+                    'target': record['target'],
+                    'options': record.get('options', {}),
+                    'moves': 0,
+                    'finished': False,
+                    'undone': False
+                }
+            elif record['run'] in runs:
+                if record['type'] == 'end':
+                    runs[record['run']]['finished'] = True
+                elif record['type'] == 'undo':
+                    runs[record['run']]['undone'] = True
+        return list(runs.values())
+    
+    def created_folders(self):
+        """Every folder journaled by record_folder"""
+        for line in self.lines():
+            if line.startswith('{"type":"folder"'):
+                try:
+                    yield json.loads(line)['path']
+                except json.JSONDecodeError:
+                    continue
+    
+    def iter_moves(self, run_id):
+        """Stream the moves of one run"""
+        prefix = '{"type":"move","run":"' + run_id + '"'
+        for line in self.lines():
+            if line.startswith(prefix):
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+    
+    def close(self):
+        """Flush, fsync and close the journal"""
+        with self.lock:
+            if self.handle is not None:
+                self.handle.flush()
+                os.fsync(self.handle.fileno())
+                self.handle.close()
+                self.handle = None
+                self.unsynced = 0
 
 class FileOrganizer:
-    def __init__(self, target_directory=None):
+    # Names browsers and download managers give files that are still being written
+    TEMPORARY_SUFFIXES = ('.part', '.partial', '.crdownload', '.download', '.opdownload', '.tmp')
+    
+    def __init__(self, target_directory=None, max_workers=8):
         # Set target directory (default: Downloads folder)
         if target_directory:
             self.target_dir = Path(target_directory)
@@ -40,201 +984,590 @@ class FileOrganizer:
             'Data': ['.json', '.xml', '.yaml', '.yml', '.sql', '.db', '.sqlite']
         }
         
-        # History file for undo functionality
+        # History journal for undo functionality (the .json file is the pre-journal format)
         self.history_file = "organization_history.json"
+        self.journal_file = "organization_history.jsonl"
+        self.journal = OrganizationJournal(self.journal_file)
         self.log_file = "file_organizer.log"
+        
+        # Persistent file index used by statistics
+        self.index_file = "file_index.db"
+        self.index = None
+        
+        # Number of worker threads used to execute moves
+        self.max_workers = max_workers
+        
+        # Number of planned moves handed to the worker pool at a time
+        self.batch_size = 1000
+        
+        # Duplicate handling: None, 'hardlink', 'skip' or 'quarantine'
+        self.dedup = None
+        self.quarantine_folder = "Duplicates"
+        
+        # Category resolvers, tried in order until one returns a category
+        self.build_extension_map()
+        self.sniff_cache = LRUCache(maxsize=4096)
+        self.resolvers = [self.resolve_by_extension, self.resolve_by_content]
+        
+        # Optional rules file (see load_rules); None means plain category folders
+        self.rules = None
+        self.rules_file = "organizer_rules.toml"
+        
+        # Logging: one persistent, buffered handle instead of open/close per line
+        self.logger = None
+        self.configure_logging()
+        
+        if os.path.exists(self.rules_file):
+            self.load_rules(self.rules_file)
+    
+    def configure_logging(self, level=logging.INFO, quiet=False, json_lines=False,
+                          max_bytes=5 * 1024 * 1024, backup_count=3):
+        """(Re)build the logger; quiet mode only prints summaries, warnings and errors"""
+        if self.logger is not None:
+            self.logger.close()
+        self.logger = OrganizerLogger(self.log_file, level=level, quiet=quiet, json_lines=json_lines,
+                                      max_bytes=max_bytes, backup_count=backup_count)
     
-    def log(self, message):
+    def log(self, message, level=logging.INFO):
         """Log message to file and console"""
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        log_message = f"[{timestamp}] {message}"
-        print(log_message)
-        
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(log_message + '\n')
+        self.logger.log(level, message)
     
-    def get_file_category(self, file_path):
-        """Determine file category based on extension"""
-        extension = file_path.suffix.lower()
-        
+    def build_extension_map(self):
+        """Flatten file_categories into an extension -> category dict (call again after editing it)"""
+        self.extension_map = {}
         for category, extensions in self.file_categories.items():
-            if extension in extensions:
+            for extension in extensions:
+                self.extension_map.setdefault(extension, category)
+    
+    def get_file_category(self, file_path):
+        """Determine file category with the resolver chain (accepts a Path or DirEntry)"""
+        for resolver in self.resolvers:
+            category = resolver(file_path)
+            if category:
                 return category
         
         return 'Others'
     
-    def organize_files(self, dry_run=False):
-        """Organize files in target directory"""
-        if not self.target_dir.exists():
-            self.log(f"✗ Directory not found: {self.target_dir}")
-            return
+    def resolve_by_extension(self, file_path):
+        """O(1) lookup of the file extension"""
+        extension = os.path.splitext(file_path.name)[1].lower()
+        return self.extension_map.get(extension)
+    
+    def resolve_by_content(self, file_path):
+        """Sniff magic bytes of files whose extension is unknown"""
+        sniffed = self.sniff_file(file_path)
+        return sniffed[1] if sniffed else None
+    
+    def get_mime_type(self, file_path):
+        """MIME type from the file contents, falling back to the extension"""
+        sniffed = self.sniff_file(file_path)
+        if sniffed:
+            return sniffed[0]
+        return mimetypes.guess_type(file_path.name)[0]
+    
+    def sniff_file(self, file_path):
+        """Return (mime, category) from the first bytes of a file, cached by (inode, mtime)"""
+        try:
+            st = file_path.stat()
+        except OSError:
+            return None
         
-        self.log("="*70)
-        self.log(f"{'DRY RUN - ' if dry_run else ''}Organizing files in: {self.target_dir}")
-        self.log("="*70)
+        # An empty file has nothing to identify it by
+        if st.st_size == 0:
+            return None
         
-        # Get all files (excluding directories)
-        files = [f for f in self.target_dir.iterdir() if f.is_file()]
+        key = (st.st_dev, st.st_ino, st.st_mtime_ns)
+        if key in self.sniff_cache:
+            return self.sniff_cache.get(key)
         
-        if not files:
-            self.log("✗ No files found to organize.")
-            return
+        # Raw os.open/os.read: a buffered open() adds fstat, ioctl and lseek calls per file
+        try:
+            fd = os.open(file_path, os.O_RDONLY)
+            try:
+                header = os.read(fd, SNIFF_BYTES)
+            finally:
+                os.close(fd)
+        except OSError:
+            return None
         
-        # Track moves for undo functionality
-        moves = []
-        stats = {}
+        sniffed = sniff_magic(header)
+        self.sniff_cache.put(key, sniffed)
+        return sniffed
+    
+    def should_skip(self, name):
+        """Check whether a file should be left alone (hidden, organizer files or unfinished downloads)"""
+        return (name.startswith('.') or name in [self.history_file, self.journal_file, self.log_file]
+                or name.startswith(self.index_file) or name.lower().endswith(self.TEMPORARY_SUFFIXES))
+    
+    def category_folder_names(self):
+        """Names of the folders the organizer sorts files into"""
+        names = set(self.file_categories.keys()) | {'Others', self.quarantine_folder}
+        if self.rules is not None:
+            names |= self.rules.top_folders
+        return names
+    
+    def load_rules(self, rules_file):
+        """Load a TOML/YAML rules file; returns True on success"""
+        try:
+            config = read_rules_file(rules_file)
+            # Extra or overridden extension mappings
+            for category, extensions in config.get('categories', {}).items():
+                self.file_categories[category] = [ext.lower() for ext in extensions]
+            self.build_extension_map()
+            self.rules = RuleSet(config.get('rules', []))
+        except (OSError, ValueError, re.error) as e:
+            self.log(f"✗ Error loading rules from {rules_file}: {e}", logging.ERROR)
+            return False
+        
+        self.log(f"✓ Loaded {len(self.rules.rules)} rule(s) from {rules_file}")
+        return True
+    
+    def scan_files(self, recursive=False, skip_category_folders=True):
+        """Yield file DirEntry objects lazily using os.scandir"""
+        category_folders = self.category_folder_names() if skip_category_folders else set()
+        pending = [str(self.target_dir)]
+        
+        while pending:
+            directory = pending.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            yield entry
+                        elif recursive and entry.is_dir(follow_symlinks=False):
+                            # Skip hidden folders and (at the top level) category folders
+                            if entry.name.startswith('.'):
+                                continue
+                            if directory == str(self.target_dir) and entry.name in category_folders:
+                                continue
+                            pending.append(entry.path)
+            except OSError as e:
+                self.log(f"✗ Cannot read {directory}: {e}", logging.ERROR)
+    
+    def list_folder_names(self, folder):
+        """List names already present in a folder with a single directory read"""
+        try:
+            return set(os.listdir(folder))
+        except FileNotFoundError:
+            return set()
+    
+    def unique_name(self, name, taken):
+        """Pick a non-colliding file name against a set of taken names"""
+        if name not in taken:
+            return name
         
-        for file_path in files:
+        stem, ext = os.path.splitext(name)
+        counter = 1
+        while f"{stem}_{counter}{ext}" in taken:
+            counter += 1
+        return f"{stem}_{counter}{ext}"
+    
+    def get_destination(self, file_entry):
+        """Return (category, folder relative to the target) from the rules or the category"""
+        if self.rules is not None:
+            matched = self.rules.match(file_entry, self)
+            if matched is not None:
+                return matched
+        
+        category = self.get_file_category(file_entry)
+        return category, category
+    
+    def plan_moves(self, files):
+        """Yield the destination of every file (one listing per destination folder per batch)"""
+        # Existing plus planned names of the folders this batch uses. run_plan executes
+        # every batch_size moves before asking for more, so the next batch lists the
+        # folders again (seeing what was just moved) and memory stays bounded
+        planned_names = {}
+        planned = 0
+        
+        for file_entry in files:
             # Skip hidden files and log files
-            if file_path.name.startswith('.') or file_path.name in [self.history_file, self.log_file]:
+            if self.should_skip(file_entry.name):
                 continue
             
-            category = self.get_file_category(file_path)
-            
-            # Create category folder if it doesn't exist
-            category_folder = self.target_dir / category
+            if planned % self.batch_size == 0:
+                planned_names = {}
+            planned += 1
             
-            if not dry_run and not category_folder.exists():
-                category_folder.mkdir(parents=True, exist_ok=True)
+            category, relative_folder = self.get_destination(file_entry)
+            dest_folder = self.target_dir / relative_folder
             
-            # Destination path
-            dest_path = category_folder / file_path.name
+            # List each destination folder only once, then resolve collisions in memory
+            taken = planned_names.get(dest_folder)
+            if taken is None:
+                taken = self.list_folder_names(dest_folder)
+                planned_names[dest_folder] = taken
             
-            # Handle duplicate filenames
-            counter = 1
-            original_dest = dest_path
-            while dest_path.exists() and not dry_run:
-                name = original_dest.stem
-                ext = original_dest.suffix
-                dest_path = category_folder / f"{name}_{counter}{ext}"
-                counter += 1
+            dest_name = self.unique_name(file_entry.name, taken)
+            taken.add(dest_name)
             
-            # Move file
-            if dry_run:
-                self.log(f"[PREVIEW] {file_path.name} → {category}/")
-            else:
+            yield {
+                'source': file_entry,
+                'category': category,
+                'dest': dest_folder / dest_name
+            }
+    
+    def move_file(self, source, dest, same_device):
+        """Move a file with os.rename, falling back to copy+unlink across devices"""
+        if same_device:
+            try:
+                os.rename(source, dest)
+                return
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+        
+        shutil.copy2(source, dest)
+        os.unlink(source)
+    
+    def execute_move(self, move, devices, run_id):
+        """Execute a single planned move (runs inside the worker pool) and journal it"""
+        source = move['source']
+        dest = move['dest']
+        record = {
+            'source': str(dest),
+            'original': os.fspath(source)
+        }
+        try:
+            link_to = move.get('link_to')
+            if link_to is not None:
+                # Replace the duplicate with a hardlink to the copy that is kept
                 try:
-                    shutil.move(str(file_path), str(dest_path))
-                    self.log(f"✓ Moved: {file_path.name} → {category}/")
-                    moves.append({
-                        'source': str(dest_path),
-                        'original': str(file_path)
-                    })
-                except Exception as e:
-                    self.log(f"✗ Error moving {file_path.name}: {e}")
+                    os.link(link_to, dest)
+                    os.unlink(source)
+                    record['linked'] = True
+                    self.journal.record_move(run_id, record)
+                    self.log(f"🔗 Linked duplicate: {source.name} → {move['category']}/")
+                    return record
+                except OSError:
+                    pass
+            
+            # DirEntry caches its stat result, so this costs at most one syscall
+            same_device = source.stat().st_dev == devices[dest.parent]
+            self.move_file(source, dest, same_device)
+            self.journal.record_move(run_id, record)
+            self.log(f"✓ Moved: {source.name} → {dest.parent.name}/")
+            return record
+        except Exception as e:
+            self.log(f"✗ Error moving {source.name}: {e}", logging.ERROR)
+            return None
+    
+    def execute_plan(self, plan, devices, executor, run_id):
+        """Run a batch of planned moves in the worker pool and return the successful ones"""
+        # Create each destination folder once and remember which device it lives on
+        for folder in {move['dest'].parent for move in plan}:
+            if folder not in devices:
+                # Rule subfolders are journaled so cleanup can tell them from the user's own
+                created = []
+                parent = folder
+                while parent != self.target_dir and not parent.exists():
+                    created.append(parent)
+                    parent = parent.parent
+                folder.mkdir(parents=True, exist_ok=True)
+                for path in created:
+                    self.journal.record_folder(run_id, os.path.abspath(path))
+                devices[folder] = folder.stat().st_dev
+        
+        # Hardlinks go last so the copy they point to is already in place
+        originals = [move for move in plan if move.get('link_to') is None]
+        links = [move for move in plan if move.get('link_to') is not None]
+        
+        results = []
+        for group in (originals, links):
+            results.extend(executor.map(lambda move: self.execute_move(move, devices, run_id), group))
+        return [result for result in results if result is not None]
+    
+    def run_plan(self, plan, dry_run=False, dedup=None, run_id=None):
+        """Execute (or preview) planned moves in batches, returning (stats, moved, duplicates)"""
+        moved = 0
+        stats = {}
+        devices = {}
+        duplicates = 0
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            finder = DuplicateFinder(self, dedup, executor) if dedup else None
             
-            # Update statistics
-            stats[category] = stats.get(category, 0) + 1
+            while True:
+                batch = list(islice(plan, self.batch_size))
+                if not batch:
+                    break
+                
+                # Dedup stage: size groups -> partial hash -> full hash
+                if finder:
+                    batch = finder.mark_duplicates(batch)
+                    for move in batch:
+                        if move.get('duplicate_of') is not None:
+                            duplicates += 1
+                            if dedup == 'skip':
+                                self.log(f"≡ Skipped duplicate: {move['source'].name} "
+                                         f"(same as {Path(move['duplicate_of']).name})")
+                    if dedup == 'skip':
+                        batch = [move for move in batch if move.get('duplicate_of') is None]
+                
+                # Counted after dedup so skipped duplicates are not reported as organized
+                for move in batch:
+                    stats[move['category']] = stats.get(move['category'], 0) + 1
+                
+                # Execution phase
+                if dry_run:
+                    for move in batch:
+                        note = " (duplicate)" if move.get('duplicate_of') is not None else ""
+                        self.log(f"[PREVIEW] {move['source'].name} → {move['dest'].parent.name}/{note}")
+                else:
+                    # Only this batch's moves are held in memory; the journal has the rest
+                    done = self.execute_plan(batch, devices, executor, run_id)
+                    moved += len(done)
+                    if finder:
+                        finder.remember(done)
+        
+        return stats, moved, duplicates
+    
+    def organize_files(self, dry_run=False, recursive=False, dedup=None, run_id=None):
+        """Organize files in target directory (pass run_id to resume an interrupted run)"""
+        dedup = dedup or self.dedup
+        if not self.target_dir.exists():
+            self.log(f"✗ Directory not found: {self.target_dir}", logging.WARNING)
+            return
+        
+        self.log("="*70, SUMMARY)
+        self.log(f"{'DRY RUN - ' if dry_run else ''}Organizing files in: {self.target_dir}"
+                 f"{' (including subfolders)' if recursive else ''}", SUMMARY)
+        self.log("="*70, SUMMARY)
         
-        # Save history for undo
-        if not dry_run and moves:
-            self.save_history(moves)
+        # Every move is journaled as it happens, so an interrupted run can be undone or resumed
+        if not dry_run and run_id is None:
+            self.import_legacy_history()
+            run_id = self.journal.begin_run(str(self.target_dir), {'recursive': recursive, 'dedup': dedup})
+        
+        # Planning streams straight from scandir, so memory does not grow with the tree size
+        plan = self.plan_moves(self.scan_files(recursive=recursive))
+        stats, moved, duplicates = self.run_plan(plan, dry_run=dry_run, dedup=dedup, run_id=run_id)
+        
+        if not dry_run:
+            self.journal.end_run(run_id, moved)
+        
+        if not stats and not duplicates:
+            self.log("✗ No files found to organize.", logging.WARNING)
+            return
+        
+        if not dry_run and moved:
+            self.log(f"✓ History saved. Use 'undo' to reverse changes.", SUMMARY)
         
         # Print statistics
-        self.log("\n" + "="*70)
-        self.log("SUMMARY")
-        self.log("="*70)
+        self.log("\n" + "="*70, SUMMARY)
+        self.log("SUMMARY", SUMMARY)
+        self.log("="*70, SUMMARY)
         for category, count in sorted(stats.items()):
-            self.log(f"{category}: {count} file(s)")
-        self.log(f"\nTotal files {'previewed' if dry_run else 'organized'}: {sum(stats.values())}")
-        self.log("="*70)
-    
-    def save_history(self, moves):
-        """Save move history for undo functionality"""
-        history = {
-            'timestamp': datetime.now().isoformat(),
-            'moves': moves
-        }
+            self.log(f"{category}: {count} file(s)", SUMMARY)
+        if dedup:
+            self.log(f"Duplicates ({dedup}): {duplicates}", SUMMARY)
+        self.log(f"\nTotal files {'previewed' if dry_run else 'organized'}: {sum(stats.values())}", SUMMARY)
+        self.log("="*70, SUMMARY)
+    
+    def create_watcher(self, force_polling=False):
+        """Use inotify on Linux, otherwise fall back to polling"""
+        if not force_polling and sys.platform.startswith('linux'):
+            try:
+                return InotifyWatcher(self.target_dir)
+            except OSError as e:
+                self.log(f"✗ inotify unavailable ({e}), falling back to polling.", logging.WARNING)
+        return PollingWatcher(self.target_dir)
+    
+    def watch(self, settle_seconds=5.0, poll_interval=0.25, force_polling=False, stop_event=None):
+        """Keep organizing files as they land in the target directory"""
+        if not self.target_dir.exists():
+            self.log(f"✗ Directory not found: {self.target_dir}", logging.WARNING)
+            return
+        
+        # Sort whatever is already there, then only react to new arrivals
+        self.organize_files()
         
-        with open(self.history_file, 'w') as f:
-            json.dump(history, f, indent=4)
+        watcher = self.create_watcher(force_polling)
+        self.log(f"👀 Watching {self.target_dir} ({watcher.name}). Press Ctrl+C to stop.", SUMMARY)
         
-        self.log(f"✓ History saved. Use 'undo' to reverse changes.")
+        # path -> (last seen size, time the file last changed)
+        pending = {}
+        
+        try:
+            while stop_event is None or not stop_event.is_set():
+                names = watcher.read_events(poll_interval)
+                now = time.monotonic()
+                
+                # Debounce: every event restarts the settle timer of that file
+                for name in names:
+                    if not self.should_skip(name):
+                        path = self.target_dir / name
+                        pending[path] = (pending.get(path, (-1, now))[0], now)
+                
+                ready = []
+                for path, (size, since) in list(pending.items()):
+                    try:
+                        st = path.stat()
+                    except FileNotFoundError:
+                        del pending[path]
+                        continue
+                    
+                    if not stat.S_ISREG(st.st_mode) or st.st_size == 0:
+                        # Empty files are often a browser's placeholder for a download still
+                        # running under a temporary name; the next write brings them back
+                        del pending[path]
+                    elif st.st_size != size:
+                        # Still growing (e.g. a partial download)
+                        pending[path] = (st.st_size, now)
+                    elif now - since >= settle_seconds:
+                        ready.append(path)
+                        del pending[path]
+                
+                # Organize the settled files as one micro-batch
+                if ready:
+                    run_id = self.journal.begin_run(str(self.target_dir), {'dedup': self.dedup})
+                    stats, moved, _ = self.run_plan(self.plan_moves(ready), dedup=self.dedup, run_id=run_id)
+                    self.journal.end_run(run_id, moved)
+                    self.log(f"✓ Organized {moved} new file(s).", SUMMARY)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+            self.log("✓ Stopped watching.", SUMMARY)
     
-    def undo_last_organization(self):
-        """Undo last file organization"""
+    def import_legacy_history(self):
+        """Move a pre-journal organization_history.json into the journal"""
         if not os.path.exists(self.history_file):
-            self.log("✗ No history found. Nothing to undo.")
             return
         
         try:
             with open(self.history_file, 'r') as f:
                 history = json.load(f)
-        except json.JSONDecodeError:
-            self.log("✗ Error reading history file.")
+        except (OSError, json.JSONDecodeError):
+            self.log("✗ Error reading history file.", logging.ERROR)
             return
         
-        self.log("="*70)
-        self.log("UNDOING LAST ORGANIZATION")
-        self.log("="*70)
+        run_id = self.journal.begin_run(str(self.target_dir), {}, timestamp=history.get('timestamp'))
+        for move in history.get('moves', []):
+            self.journal.record_move(run_id, move)
+        self.journal.end_run(run_id, len(history.get('moves', [])))
+        os.remove(self.history_file)
+    
+    def restore_move(self, move):
+        """Move one file back to where it came from (runs inside the worker pool)"""
+        source = Path(move['source'])
+        original = Path(move['original'])
         
-        moves = history.get('moves', [])
-        success_count = 0
+        if not source.exists():
+            self.log(f"✗ File not found: {source.name}", logging.WARNING)
+            return False
+        if original.exists():
+            self.log(f"✗ Original location is taken, leaving {source.name} in place", logging.WARNING)
+            return False
         
-        for move in moves:
-            source = Path(move['source'])
-            original = Path(move['original'])
-            
-            if source.exists():
-                try:
-                    shutil.move(str(source), str(original))
-                    self.log(f"✓ Restored: {source.name} → {original.parent.name}/")
-                    success_count += 1
-                except Exception as e:
-                    self.log(f"✗ Error restoring {source.name}: {e}")
+        try:
+            original.parent.mkdir(parents=True, exist_ok=True)
+            if move.get('linked') and source.stat().st_nlink > 1:
+                # A dedup hardlink shares its inode with the kept copy; give the
+                # original back as an independent file so editing one never edits both
+                shutil.copy2(source, original)
+                os.unlink(source)
             else:
-                self.log(f"✗ File not found: {source.name}")
+                self.move_file(source, original, same_device=True)
+            self.log(f"✓ Restored: {source.name} → {original.parent.name}/")
+            return True
+        except Exception as e:
+            self.log(f"✗ Error restoring {source.name}: {e}", logging.ERROR)
+            return False
+    
+    def undo_run(self, run):
+        """Undo a single journaled run, restoring its files in parallel"""
+        self.log(f"↩️  Undoing run from {run['timestamp']} ({run['moves']} file(s))", SUMMARY)
         
-        # Remove empty category folders
-        for category in self.file_categories.keys():
-            category_folder = self.target_dir / category
-            if category_folder.exists() and not any(category_folder.iterdir()):
-                category_folder.rmdir()
-                self.log(f"✓ Removed empty folder: {category}/")
+        # Memory use is bounded by this one run's moves
+        moves = list(self.journal.iter_moves(run['run']))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            restored = sum(executor.map(self.restore_move, reversed(moves)))
         
-        # Delete history file
-        os.remove(self.history_file)
+        self.journal.mark_undone(run['run'])
+        return restored
+    
+    def recent_runs(self):
+        """Runs that can still be undone, newest first (finished runs that moved nothing are skipped)"""
+        self.import_legacy_history()
+        return [run for run in reversed(self.journal.runs())
+                if not run['undone'] and (run['moves'] or not run['finished'])]
+    
+    def undo_last_organization(self, count=1):
+        """Undo the last `count` file organizations"""
+        runs = self.recent_runs()[:count]
+        if not runs:
+            self.log("✗ No history found. Nothing to undo.", logging.WARNING)
+            return
+        
+        self.log("="*70, SUMMARY)
+        self.log(f"UNDOING LAST {len(runs)} ORGANIZATION(S)", SUMMARY)
+        self.log("="*70, SUMMARY)
+        
+        success_count = 0
+        for run in runs:
+            success_count += self.undo_run(run)
+        
+        # Remove empty category folders
+        for folder in self.remove_empty_folders():
+            self.log(f"✓ Removed empty folder: {folder}/")
         
-        self.log("="*70)
-        self.log(f"✓ Undo complete! Restored {success_count} file(s).")
-        self.log("="*70)
+        self.log("="*70, SUMMARY)
+        self.log(f"✓ Undo complete! Restored {success_count} file(s).", SUMMARY)
+        self.log("="*70, SUMMARY)
     
-    def show_statistics(self):
-        """Show current directory statistics"""
-        self.log("="*70)
-        self.log(f"DIRECTORY STATISTICS: {self.target_dir}")
-        self.log("="*70)
+    def resume_interrupted(self):
+        """Finish the most recent run that never completed"""
+        for run in self.recent_runs():
+            if run['finished']:
+                continue
+            
+            self.log(f"↪️  Resuming run from {run['timestamp']} "
+                     f"({run['moves']} file(s) already moved)", SUMMARY)
+            self.target_dir = Path(run['target'])
+            options = run['options']
+            self.organize_files(recursive=options.get('recursive', False),
+                                dedup=options.get('dedup'), run_id=run['run'])
+            return
         
-        # Count files by category
-        stats = {}
-        total_files = 0
-        total_size = 0
+        self.log("✓ No interrupted organization to resume.", SUMMARY)
+    
+    def get_index(self):
+        """Open the persistent directory index on first use"""
+        if self.index is None:
+            self.index = DirectoryIndex(self.index_file)
+        return self.index
+    
+    def show_statistics(self, verify=False):
+        """Show current directory statistics (answered from the index)"""
+        self.log("="*70, SUMMARY)
+        self.log(f"DIRECTORY STATISTICS: {self.target_dir}", SUMMARY)
+        self.log("="*70, SUMMARY)
         
-        for item in self.target_dir.rglob('*'):
-            if item.is_file():
-                # Skip hidden and log files
-                if item.name.startswith('.') or item.name in [self.history_file, self.log_file]:
-                    continue
-                
-                category = self.get_file_category(item)
-                stats[category] = stats.get(category, 0) + 1
-                total_files += 1
-                total_size += item.stat().st_size
+        # Only folders changed since the last run are rescanned, unless verifying
+        root = os.path.abspath(self.target_dir)
+        index = self.get_index()
+        rescanned = index.refresh(root, self.get_file_category, self.should_skip, full=verify)
+        stats = index.category_stats(root)
         
         if not stats:
-            self.log("✗ No files found.")
+            self.log("✗ No files found.", logging.WARNING)
             return
         
+        total_files = sum(count for count, _ in stats.values())
+        total_size = sum(size for _, size in stats.values())
+        
         # Print statistics
-        self.log(f"{'Category':<20} {'Count':>10}")
-        self.log("-"*70)
+        self.log(f"{'Category':<20} {'Count':>10}", SUMMARY)
+        self.log("-"*70, SUMMARY)
         for category in sorted(stats.keys()):
-            self.log(f"{category:<20} {stats[category]:>10}")
+            self.log(f"{category:<20} {stats[category][0]:>10}", SUMMARY)
         
-        self.log("-"*70)
-        self.log(f"{'Total Files':<20} {total_files:>10}")
-        self.log(f"{'Total Size':<20} {self.format_size(total_size):>10}")
-        self.log("="*70)
+        self.log("-"*70, SUMMARY)
+        self.log(f"{'Total Files':<20} {total_files:>10}", SUMMARY)
+        self.log(f"{'Total Size':<20} {self.format_size(total_size):>10}", SUMMARY)
+        self.log(f"{'Folders Rescanned':<20} {rescanned:>10}{' (full verify)' if verify else ''}", SUMMARY)
+        self.log("="*70, SUMMARY)
     
     def format_size(self, size):
         """Format file size in human-readable format"""
@@ -244,26 +1577,38 @@ class FileOrganizer:
             size /= 1024.0
         return f"{size:.2f} PB"
     
+    def remove_empty_folders(self):
+        """Remove empty category folders and the empty subfolders the organizer created"""
+        target = os.path.abspath(self.target_dir)
+        folders = {os.path.join(target, category) for category in self.category_folder_names()}
+        for path in self.journal.created_folders():
+            if path.startswith(target + os.sep):
+                folders.add(path)
+        
+        # Deepest first, so folders emptied by removing their children go too
+        removed = []
+        for folder in sorted(folders, key=lambda path: (-path.count(os.sep), path)):
+            if os.path.isdir(folder) and not os.path.islink(folder) and not os.listdir(folder):
+                os.rmdir(folder)
+                removed.append(os.path.relpath(folder, target))
+        return removed
+    
     def clean_empty_folders(self):
         """Remove empty category folders"""
-        self.log("="*70)
-        self.log("CLEANING EMPTY FOLDERS")
-        self.log("="*70)
+        self.log("="*70, SUMMARY)
+        self.log("CLEANING EMPTY FOLDERS", SUMMARY)
+        self.log("="*70, SUMMARY)
         
         removed_count = 0
-        for category in self.file_categories.keys():
-            category_folder = self.target_dir / category
-            if category_folder.exists() and category_folder.is_dir():
-                if not any(category_folder.iterdir()):
-                    category_folder.rmdir()
-                    self.log(f"✓ Removed: {category}/")
-                    removed_count += 1
+        for folder in self.remove_empty_folders():
+            self.log(f"✓ Removed: {folder}/")
+            removed_count += 1
         
         if removed_count == 0:
-            self.log("✓ No empty folders found.")
+            self.log("✓ No empty folders found.", SUMMARY)
         else:
-            self.log(f"✓ Removed {removed_count} empty folder(s).")
-        self.log("="*70)
+            self.log(f"✓ Removed {removed_count} empty folder(s).", SUMMARY)
+        self.log("="*70, SUMMARY)
 
 def show_menu():
     """Display main menu"""
@@ -272,46 +1617,115 @@ def show_menu():
     print("="*70)
     print("1. Organize Files")
     print("2. Preview Organization (Dry Run)")
-    print("3. Undo Last Organization")
+    print("3. Undo Organization(s)")
     print("4. Show Statistics")
     print("5. Clean Empty Folders")
     print("6. Change Target Directory")
-    print("7. Exit")
+    print("7. Resume Interrupted Organization")
+    print("8. Exit")
     print("="*70)
 
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Auto-organize files into categorized folders")
+    parser.add_argument('--dir', help="target directory (default: ~/Downloads)")
+    parser.add_argument('--stats', action='store_true', help="print statistics and exit")
+    parser.add_argument('--verify', action='store_true',
+                        help="do a full rescan instead of trusting the index")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and organize files as they arrive")
+    parser.add_argument('--settle', type=float, default=5.0,
+                        help="seconds a file size must stay unchanged before it is moved (default: 5)")
+    parser.add_argument('--poll', action='store_true',
+                        help="use polling instead of inotify in watch mode")
+    parser.add_argument('--undo', type=int, metavar='N',
+                        help="undo the last N organizations and exit")
+    parser.add_argument('--resume', action='store_true',
+                        help="finish an interrupted organization and exit")
+    parser.add_argument('--rules', help="TOML or YAML rules file (default: organizer_rules.toml if present)")
+    parser.add_argument('--quiet', action='store_true',
+                        help="only print summaries, warnings and errors")
+    parser.add_argument('--log-level', default='INFO',
+                        choices=['DEBUG', 'INFO', 'SUMMARY', 'WARNING', 'ERROR'],
+                        help="lowest level written to the log (default: INFO)")
+    parser.add_argument('--json-log', action='store_true',
+                        help="write the log file as JSON lines")
+    parser.add_argument('--dedup', choices=['hardlink', 'skip', 'quarantine'],
+                        help="what to do with files whose content already exists in their category")
+    return parser.parse_args()
+
 def main():
     """Main program"""
+    args = parse_args()
+    organizer = FileOrganizer(args.dir)
+    organizer.dedup = args.dedup
+    organizer.configure_logging(level=logging.getLevelName(args.log_level), quiet=args.quiet,
+                                json_lines=args.json_log)
+    if args.rules and not organizer.load_rules(args.rules):
+        return
+    
+    if args.undo:
+        organizer.undo_last_organization(args.undo)
+        return
+    
+    if args.resume:
+        organizer.resume_interrupted()
+        return
+    
+    if args.watch:
+        organizer.watch(settle_seconds=args.settle, force_polling=args.poll)
+        return
+    
+    if args.stats or args.verify:
+        organizer.show_statistics(verify=args.verify)
+        return
+    
     print("="*70)
     print("📁 FILE ORGANIZER 📁".center(70))
     print("="*70)
     print("Automatically organize your files into categorized folders!")
     
-    organizer = FileOrganizer()
-    
     while True:
         show_menu()
         print(f"\nCurrent directory: {organizer.target_dir}")
-        choice = input("\nEnter your choice (1-7): ").strip()
+        choice = input("\nEnter your choice (1-8): ").strip()
         
         if choice == '1':
             confirm = input(f"\nOrganize files in '{organizer.target_dir}'? (y/n): ")
             if confirm.lower() == 'y':
-                organizer.organize_files(dry_run=False)
+                recursive = input("Include subfolders? (y/n): ").lower() == 'y'
+                organizer.organize_files(dry_run=False, recursive=recursive)
             else:
                 print("✗ Cancelled.")
         
         elif choice == '2':
-            organizer.organize_files(dry_run=True)
+            recursive = input("\nInclude subfolders? (y/n): ").lower() == 'y'
+            organizer.organize_files(dry_run=True, recursive=recursive)
         
         elif choice == '3':
-            confirm = input("\nUndo last organization? (y/n): ")
-            if confirm.lower() == 'y':
-                organizer.undo_last_organization()
+            runs = organizer.recent_runs()
+            if not runs:
+                print("✗ No history found. Nothing to undo.")
+                continue
+            
+            print("\nRecent organizations (newest first):")
+            for idx, run in enumerate(runs[:10], 1):
+                status = "" if run['finished'] else " (interrupted)"
+                print(f"{idx}. {run['timestamp'][:19]} - {run['moves']} file(s){status}")
+            
+            count = input("\nHow many to undo? [1]: ").strip() or '1'
+            if count.isdigit() and int(count) > 0:
+                confirm = input(f"Undo last {count} organization(s)? (y/n): ")
+                if confirm.lower() == 'y':
+                    organizer.undo_last_organization(int(count))
+                else:
+                    print("✗ Cancelled.")
             else:
-                print("✗ Cancelled.")
+                print("✗ Invalid number.")
         
         elif choice == '4':
-            organizer.show_statistics()
+            verify = input("\nVerify with a full rescan? (y/n): ").lower() == 'y'
+            organizer.show_statistics(verify=verify)
         
         elif choice == '5':
             organizer.clean_empty_folders()
@@ -326,6 +1740,9 @@ def main():
                 print("✗ Invalid directory path.")
         
         elif choice == '7':
+            organizer.resume_interrupted()
+        
+        elif choice == '8':
             print("\n👋 Goodbye! Keep your files organized!")
             break
         